@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Путь к собранному снимку справочников по умолчанию
+SNAPSHOT_PATH = "catalog.snapshot.json"
+SNAPSHOT_VERSION = 2
+
+# Разделы снимка и файлы, из которых они собираются по умолчанию
+DEFAULT_SOURCES = {
+    "houses": "Houses.xlsx",
+    "works": "works.xlsx",
+    "houses_dict": "dic_houses.json",
+    "list_works": "list_works.json",
+}
+
+_loaded = {}
+
+
+def _source_signature(path):
+    """Размер и sha256 исходного файла: mtime не годится, он может не измениться при перезаписи или откатиться назад."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return {"size": os.path.getsize(path), "sha256": digest.hexdigest()}
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _read_section(name, path):
+    # openpyxl импортируется только здесь, при сборке снимка
+    from catalogs import read_houses_xlsx, read_works_xlsx
+
+    readers = {
+        "houses": read_houses_xlsx,
+        "works": read_works_xlsx,
+        "houses_dict": _read_json,
+        "list_works": _read_json,
+    }
+    return readers[name](path)
+
+
+def build_snapshot(sources=None, snapshot_path=SNAPSHOT_PATH):
+    """Собирает справочники из Excel/JSON в один компактный файл снимка."""
+    sources = sources or DEFAULT_SOURCES
+    snapshot = {"version": SNAPSHOT_VERSION, "sources": {}}
+    for name, path in sources.items():
+        if not os.path.exists(path):
+            logger.warning(f"Файл {path} для раздела {name} не найден, раздел пропущен.")
+            continue
+        snapshot["sources"][name] = {"path": os.path.abspath(path), **_source_signature(path)}
+        snapshot[name] = _read_section(name, path)
+
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(snapshot, file, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, snapshot_path)
+    _loaded.pop(snapshot_path, None)
+    logger.info(f"Снимок справочников собран: {snapshot_path} ({', '.join(snapshot['sources'])}).")
+    return snapshot
+
+
+def _load(snapshot_path):
+    if snapshot_path not in _loaded:
+        try:
+            snapshot = _read_json(snapshot_path)
+            if snapshot.get("version") != SNAPSHOT_VERSION:
+                snapshot = None
+        except (OSError, ValueError):
+            snapshot = None
+        _loaded[snapshot_path] = snapshot
+    return _loaded[snapshot_path]
+
+
+def load_section(snapshot_path, name, source_path):
+    """
+    Возвращает раздел снимка, если снимок собран из текущей версии source_path, иначе None.
+    Тогда вызывающий код читает исходный файл сам.
+    """
+    snapshot = _load(snapshot_path)
+    if not snapshot or name not in snapshot:
+        return None
+    recorded = snapshot["sources"][name]
+    try:
+        # Сначала дешевая сверка размера, хэш считается только при совпадении
+        stale = (os.path.getsize(source_path) != recorded["size"]
+                 or _source_signature(source_path)["sha256"] != recorded["sha256"])
+    except FileNotFoundError:
+        return None
+    if stale:
+        logger.info(f"Снимок {snapshot_path} устарел для {source_path}, читаем исходный файл.")
+        return None
+    return snapshot[name]
+
+
+if __name__ == '__main__':
+    # Сборка при деплое: python catalog_snapshot.py [путь_к_снимку]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    build_snapshot(snapshot_path=sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH)
@@ -0,0 +1,196 @@
+import os
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from telegram import ReplyKeyboardMarkup, KeyboardButton
+
+from catalog_snapshot import load_section
+
+logger = logging.getLogger(__name__)
+
+# Как часто фоновый поток проверяет, не изменился ли файл справочника (секунды)
+CHECK_INTERVAL = 5
+
+
+def read_houses_xlsx(path):
+    """Houses.xlsx -> {номер дома: полное название}. Первая колонка — номер, вторая — название."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        houses = {}
+        for row in workbook.active.iter_rows(values_only=True):
+            if not row or row[0] is None:
+                continue
+            # Номера храним строками; при повторе номера побеждает первая строка, как раньше
+            houses.setdefault(str(row[0]), row[1] if len(row) > 1 else None)
+        return houses
+    finally:
+        workbook.close()
+
+
+def read_works_xlsx(path):
+    """works.xlsx -> [(тип работы, описание)]. Первая строка — заголовок."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [
+            (row[0], row[1] if len(row) > 1 else None)
+            for row in workbook.active.iter_rows(min_row=2, values_only=True)
+            if row and row[0] is not None
+        ]
+    finally:
+        workbook.close()
+
+
+class ReloadingCatalog(ABC):
+    """
+    Справочник, построенный из файла один раз и пересобираемый в фоне при изменении файла.
+
+    Читатели всегда видят готовую версию: новая собирается целиком и подменяется одной ссылкой.
+    Если передан snapshot_path и снимок собран из текущей версии файла, первая загрузка
+    берется из снимка без разбора исходного файла.
+    """
+
+    # Раздел в снимке справочников (catalog_snapshot.py)
+    snapshot_section = None
+
+    def __init__(self, path, check_interval=CHECK_INTERVAL, snapshot_path=None):
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = None
+        self._data = self._empty()
+        self._stop = threading.Event()
+        self._thread = None
+        if not (snapshot_path and self._load_snapshot(snapshot_path)):
+            self.reload()
+
+    def _load_snapshot(self, snapshot_path):
+        section = load_section(snapshot_path, self.snapshot_section, self.path)
+        if section is None:
+            return False
+        data = self._from_snapshot(section)
+        old, self._data = self._data, data
+        self._mtime = self._current_mtime()
+        self._on_reloaded(old, data)
+        logger.info(f"Справочник {self.path} загружен из снимка: {len(data)} записей.")
+        return True
+
+    def _from_snapshot(self, section):
+        return section
+
+    @abstractmethod
+    def _empty(self):
+        """Пустая версия данных, пока файл не прочитан."""
+
+    @abstractmethod
+    def _build(self):
+        """Читает файл и возвращает новую версию данных."""
+
+    def _on_reloaded(self, old, new):
+        """Вызывается после подмены данных."""
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        """Пересобирает справочник, если файл изменился с прошлой сборки."""
+        mtime = self._current_mtime()
+        if mtime is None or mtime == self._mtime:
+            if mtime is None:
+                logger.error(f"Файл справочника {self.path} не найден.")
+            return False
+        try:
+            data = self._build()
+        except Exception as e:
+            logger.error(f"Ошибка при чтении файла {self.path}: {e}")
+            return False
+        old, self._data = self._data, data
+        self._mtime = mtime
+        self._on_reloaded(old, data)
+        logger.info(f"Справочник {self.path} загружен: {len(data)} записей.")
+        return True
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.check_interval):
+            self.reload()
+
+    def start_watching(self):
+        """Запускает фоновую проверку изменений файла."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._watch_loop, name=f"watch-{os.path.basename(self.path)}", daemon=True
+        )
+        self._thread.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+
+class HouseIndex(ReloadingCatalog):
+    """Номер дома -> полное название из Houses.xlsx."""
+
+    snapshot_section = "houses"
+
+    def _empty(self):
+        return {}
+
+    def _build(self):
+        return read_houses_xlsx(self.path)
+
+    def get(self, house_number):
+        return self._data.get(str(house_number))
+
+
+class WorkCatalog(ReloadingCatalog):
+    """
+    Типы работ из works.xlsx (первая колонка — тип, вторая — описание, первая строка — заголовок).
+
+    Клавиатура выбора типа работ собирается один раз на каждую версию файла,
+    descriptions.txt перезаписывается, только если описания действительно изменились.
+    """
+
+    snapshot_section = "works"
+
+    def __init__(self, path, descriptions_path=None, check_interval=CHECK_INTERVAL, snapshot_path=None):
+        self.descriptions_path = descriptions_path
+        self.keyboard = None
+        super().__init__(path, check_interval, snapshot_path)
+
+    def _empty(self):
+        return ()
+
+    def _build(self):
+        return tuple(read_works_xlsx(self.path))
+
+    def _from_snapshot(self, section):
+        return tuple(tuple(work) for work in section)
+
+    def _on_reloaded(self, old, new):
+        self.keyboard = ReplyKeyboardMarkup(
+            tuple((KeyboardButton(work_type),) for work_type, _ in new), one_time_keyboard=True
+        )
+        if self.descriptions_path:
+            self._write_descriptions(new)
+
+    def _write_descriptions(self, works):
+        text = "".join(f"{description}\n" for _, description in works)
+        try:
+            with open(self.descriptions_path, "r", encoding="utf-8") as file:
+                if file.read() == text:
+                    return
+        except FileNotFoundError:
+            pass
+        with open(self.descriptions_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        logger.info(f"Файл {self.descriptions_path} обновлен.")
+
+    @property
+    def work_types(self):
+        return [work_type for work_type, _ in self._data]
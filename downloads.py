@@ -0,0 +1,203 @@
+import os
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import logging
+import threading
+
+import httpx
+
+import executors
+from executors import run_io
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд дается на одну попытку скачивания целиком
+DOWNLOAD_TIMEOUT = 60
+# Сколько секунд ждать соединения и каждого следующего куска ответа
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 20
+# Попыток на один файл и пауза перед повтором: BACKOFF_BASE * 2^n, не больше BACKOFF_MAX, со случайным разбросом
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+# Больше Bot API все равно не отдает (20 МБ); файл больше бюджета не скачивается и не повторяется
+MAX_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Коды ответа, при которых стоит повторить попытку
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadTooLarge(DownloadError):
+    """Файл больше бюджета: повтор не поможет."""
+
+
+class DownloadManager:
+    """
+    Скачивание файлов по HTTP с повторами, таймаутами и ограничением размера.
+
+    Файл пишется во временный dest_path.<uuid>.part рядом с целевым и переносится
+    на место через os.replace только после полной загрузки и сверки размера,
+    поэтому недокачанный файл никогда не оказывается по пути dest_path.
+    Клиент можно передать снаружи, поэтому проверяется без сети через httpx.MockTransport (test_downloads.py).
+    """
+
+    def __init__(self, timeout=DOWNLOAD_TIMEOUT, max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, max_bytes=MAX_BYTES, client=None):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_bytes = max_bytes
+        # Клиент создается при первом скачивании, внутри работающего цикла событий
+        self._client = client
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT), follow_redirects=True
+            )
+        return self._client
+
+    async def _fetch(self, url, tmp_path, max_bytes, expected_size):
+        size = 0
+        async with self._get_client().stream("GET", url) as response:
+            response.raise_for_status()
+            length = response.headers.get("Content-Length")
+            if length is not None and int(length) > max_bytes:
+                raise DownloadTooLarge(f"{tmp_path}: {length} байт больше бюджета {max_bytes}.")
+            # Открытие, запись кусков и закрытие идут в пуле ввода-вывода, а не в цикле событий
+            f = await run_io(open, tmp_path, "wb")
+            try:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise DownloadTooLarge(f"{tmp_path}: больше бюджета {max_bytes} байт.")
+                    await run_io(f.write, chunk)
+            finally:
+                await run_io(f.close)
+        if expected_size and size != expected_size:
+            raise DownloadError(f"{tmp_path}: получено {size} байт из {expected_size}.")
+        return size
+
+    def _retryable(self, error):
+        if isinstance(error, DownloadTooLarge):
+            return False
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRY_STATUSES
+        return isinstance(error, (DownloadError, httpx.TransportError, asyncio.TimeoutError))
+
+    @staticmethod
+    def _describe(error):
+        # В URL файлов Telegram есть токен бота, поэтому в лог идет только тип ошибки и код ответа
+        if isinstance(error, httpx.HTTPStatusError):
+            return f"HTTP {error.response.status_code}"
+        if isinstance(error, httpx.HTTPError):
+            return type(error).__name__
+        return f"{type(error).__name__}: {error}"
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def download(self, url, dest_path, expected_size=None, max_bytes=None):
+        """Скачивает url в dest_path. Возвращает dest_path; если все попытки не удались — DownloadError."""
+        max_bytes = max_bytes or self.max_bytes
+        if expected_size and expected_size > max_bytes:
+            raise DownloadTooLarge(f"{dest_path}: {expected_size} байт больше бюджета {max_bytes}.")
+
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+        attempt = 0
+        try:
+            while True:
+                started_at = time.monotonic()
+                try:
+                    size = await asyncio.wait_for(
+                        self._fetch(url, tmp_path, max_bytes, expected_size), self.timeout
+                    )
+                except Exception as e:
+                    attempt += 1
+                    if attempt >= self.max_attempts or not self._retryable(e):
+                        with self._lock:
+                            self.failed += 1
+                        if isinstance(e, DownloadError):
+                            raise
+                        raise DownloadError(
+                            f"Не удалось скачать {dest_path} за {attempt} попыток: {self._describe(e)}"
+                        ) from None
+                    delay = self._backoff(attempt - 1)
+                    logger.warning(f"Скачивание {dest_path} не удалось ({self._describe(e)}), попытка {attempt + 1} через {delay:.1f} с.")
+                    with self._lock:
+                        self.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                await run_io(os.replace, tmp_path, dest_path)
+                with self._lock:
+                    self.completed += 1
+                    self.bytes += size
+                    self.seconds += time.monotonic() - started_at
+                return dest_path
+        finally:
+            await run_io(_remove_part, tmp_path)
+
+    async def download_telegram_file(self, file, dest_path):
+        """
+        Скачивает telegram.File. Если Bot API работает в локальном режиме, file_path — путь
+        на диске, и файл просто копируется (тоже через временный файл).
+        """
+        if file.file_path is None:
+            raise DownloadError(f"У файла {file.file_id} нет file_path.")
+        if file.file_path.startswith(("http://", "https://")):
+            return await self.download(file.file_path, dest_path, expected_size=file.file_size)
+        return await run_io(_copy_atomic, file.file_path, dest_path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "bytes": self.bytes,
+                "avg_ms": round(self.seconds / (self.completed or 1) * 1000, 2),
+                "throughput_kbps": round(self.bytes / 1024 / self.seconds, 1) if self.seconds else 0.0,
+            }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _remove_part(tmp_path):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _copy_atomic(src_path, dest_path):
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+    try:
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    finally:
+        _remove_part(tmp_path)
+    return dest_path
+
+
+DOWNLOADS = DownloadManager()
+executors.register_stats("downloads", DOWNLOADS.stats)
+
+
+async def download_telegram_file(file, dest_path):
+    return await DOWNLOADS.download_telegram_file(file, dest_path)
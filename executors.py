@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Потоки для дисковых операций (JSON, report.txt, Excel, обход папок)
+IO_WORKERS = 8
+# Потоки для тяжелых вычислений (сборка PDF, уменьшение фото и т.п.)
+CPU_WORKERS = os.cpu_count() or 2
+# Сколько задач может одновременно ждать в очереди пула, остальные обработчики ждут без блокировки цикла
+IO_MAX_PENDING = 256
+CPU_MAX_PENDING = 64
+# Как часто писать статистику пулов в лог (секунды)
+STATS_LOG_INTERVAL = 600
+
+
+class BoundedPool:
+    """Пул потоков с ограниченной очередью и счетчиками для подбора размера."""
+
+    def __init__(self, name, max_workers, max_pending):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет func(*args, **kwargs) в пуле и возвращает результат."""
+        async with self._slots:
+            enqueued_at = time.monotonic()
+            with self._lock:
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+
+            def call():
+                started_at = time.monotonic()
+                wait = started_at - enqueued_at
+                with self._lock:
+                    self.queued -= 1
+                    self.running += 1
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+                ok = False
+                try:
+                    result = func(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    with self._lock:
+                        self.running -= 1
+                        self.completed += 1
+                        self.total_run += time.monotonic() - started_at
+                        if not ok:
+                            self.failed += 1
+
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def stats(self):
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_queued": self.max_queued,
+                "avg_wait_ms": round(self.total_wait / done * 1000, 2),
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "avg_run_ms": round(self.total_run / done * 1000, 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+IO_POOL = BoundedPool("io", IO_WORKERS, IO_MAX_PENDING)
+CPU_POOL = BoundedPool("cpu", CPU_WORKERS, CPU_MAX_PENDING)
+
+
+async def run_io(func, *args, **kwargs):
+    """Дисковая операция вне цикла событий."""
+    return await IO_POOL.run(func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Тяжелое вычисление вне цикла событий."""
+    return await CPU_POOL.run(func, *args, **kwargs)
+
+
+# Статистика других модулей (например, скачиваний), которая пишется в лог вместе со статистикой пулов
+_extra_stats = {}
+
+
+def register_stats(name, func):
+    _extra_stats[name] = func
+
+
+def stats():
+    result = {"io": IO_POOL.stats(), "cpu": CPU_POOL.stats()}
+    for name, func in _extra_stats.items():
+        result[name] = func()
+    return result
+
+
+def log_stats():
+    for name, pool_stats in stats().items():
+        logger.info(f"Статистика {name}: {pool_stats}")
+
+
+def start_stats_logging(interval=STATS_LOG_INTERVAL):
+    """Периодически пишет статистику пулов в лог из фонового потока."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            log_stats()
+
+    threading.Thread(target=loop, name="executors-stats", daemon=True).start()
+
+
+def shutdown():
+    log_stats()
+    IO_POOL.shutdown()
+    CPU_POOL.shutdown()
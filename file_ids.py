@@ -0,0 +1,95 @@
+import os
+import logging
+from datetime import datetime
+
+from telegram.error import BadRequest
+
+import storage
+from executors import run_io
+import photo_store
+
+logger = logging.getLogger(__name__)
+
+# Вид файла в Telegram: file_id фото нельзя отправить как документ и наоборот
+KIND_PHOTO = "photo"
+KIND_DOCUMENT = "document"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telegram_file_ids (
+    sha256 TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_unique_id TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (sha256, kind)
+);
+"""
+
+
+def lookup(sha256, kind):
+    """file_id, под которым файл с таким содержимым уже есть в Telegram, или None."""
+    row = storage.get_connection().execute(
+        "SELECT file_id FROM telegram_file_ids WHERE sha256 = ? AND kind = ?", (sha256, kind)
+    ).fetchone()
+    return row["file_id"] if row else None
+
+
+def remember(sha256, kind, file_id, file_unique_id=None):
+    with storage.transaction() as conn:
+        conn.execute(
+            "INSERT INTO telegram_file_ids (sha256, kind, file_id, file_unique_id, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(sha256, kind) DO UPDATE SET file_id = excluded.file_id, "
+            "file_unique_id = excluded.file_unique_id, updated_at = excluded.updated_at",
+            (sha256, kind, file_id, file_unique_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+
+def forget(sha256, kind):
+    with storage.transaction() as conn:
+        conn.execute("DELETE FROM telegram_file_ids WHERE sha256 = ? AND kind = ?", (sha256, kind))
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _reply(path, kind, send, sent_file, **kwargs):
+    """
+    Отправляет файл по file_id, если файл с таким содержимым уже отправлялся или был получен,
+    иначе загружает его и запоминает file_id из ответа Telegram.
+    """
+    sha256 = await run_io(photo_store.file_sha256, path)
+    file_id = await run_io(lookup, sha256, kind)
+    if file_id is not None:
+        try:
+            return await send(file_id, **kwargs)
+        except BadRequest as e:
+            # file_id больше не действует (например, другой токен бота) — загружаем заново
+            logger.warning(f"file_id для {path} не принят Telegram: {e}")
+            await run_io(forget, sha256, kind)
+
+    sent = await send(await run_io(_read, path), **kwargs)
+    file = sent_file(sent)
+    if file is not None:
+        await run_io(remember, sha256, kind, file.file_id, file.file_unique_id)
+    return sent
+
+
+async def reply_photo(message, path, **kwargs):
+    """message.reply_photo для локального файла без повторной загрузки уже известных Telegram фото."""
+    return await _reply(
+        path, KIND_PHOTO, message.reply_photo, lambda sent: sent.photo[-1] if sent.photo else None, **kwargs
+    )
+
+
+async def reply_document(message, path, filename=None, **kwargs):
+    """message.reply_document для локального файла без повторной загрузки уже отправленных документов."""
+    return await _reply(
+        path, KIND_DOCUMENT, message.reply_document, lambda sent: sent.document,
+        filename=filename or os.path.basename(path), **kwargs
+    )
+
+
+def init():
+    storage.get_connection().executescript(SCHEMA)
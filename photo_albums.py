@@ -0,0 +1,51 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ждать следующее фото альбома, прежде чем считать альбом полным
+ALBUM_WAIT = 1.5
+
+
+class AlbumCollector:
+    """
+    Собирает фото одного альбома (сообщения с общим media_group_id).
+
+    Telegram присылает каждое фото альбома отдельным сообщением. Обработчик только
+    добавляет сообщение через add() и сразу возвращается; когда ALBUM_WAIT секунд
+    не приходит новых фото, on_complete вызывается один раз со всеми сообщениями по порядку.
+    """
+
+    def __init__(self, wait=ALBUM_WAIT):
+        self.wait = wait
+        self._albums = {}
+        self._tasks = set()
+
+    def add(self, message, on_complete, key=None):
+        """
+        key — по какому признаку сообщения собираются вместе, по умолчанию (chat_id, media_group_id).
+        Обработчики фото передают (chat_id, этап): Telegram делит альбом больше 10 фото на несколько
+        групп, и все фото этапа, пришедшие подряд, должны сохраниться одним пакетом.
+        """
+        key = key or (message.chat_id, message.media_group_id)
+        album = self._albums.setdefault(key, {"messages": [], "timer": None})
+        album["messages"].append(message)
+        if album["timer"] is not None:
+            album["timer"].cancel()
+        album["timer"] = asyncio.get_running_loop().call_later(self.wait, self._complete, key, on_complete)
+
+    def pending(self, key):
+        """Собирается ли сейчас пакет с этим ключом (к нему надо добавить и одиночное фото)."""
+        return key in self._albums
+
+    def _complete(self, key, on_complete):
+        album = self._albums.pop(key)
+        messages = sorted(album["messages"], key=lambda message: message.message_id)
+        task = asyncio.ensure_future(on_complete(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка при обработке альбома: {task.exception()}")
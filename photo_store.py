@@ -0,0 +1,206 @@
+import os
+import uuid
+import asyncio
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+
+import storage
+import file_ids
+import downloads
+from executors import run_io, run_cpu
+
+logger = logging.getLogger(__name__)
+
+# Хранилище фото по содержимому: blobs/<первые 2 символа sha256>/<sha256>.jpg
+BLOBS_DIR = "blobs"
+
+# Длинная сторона фото в пикселях, которой хватает для PDF (90 мм при 300 dpi) и презентаций
+TARGET_SIDE = 1280
+# Качество JPEG при пересжатии уменьшенного фото
+JPEG_QUALITY = 85
+# Сохранять ли оригинал, если фото пришлось уменьшить (blobs/originals/)
+KEEP_ORIGINALS = False
+# Сколько фото скачивается одновременно (на весь бот, а не на один альбом)
+MAX_PARALLEL_DOWNLOADS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photo_blobs (
+    file_unique_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_photo_blobs_sha256 ON photo_blobs (sha256);
+"""
+
+_blobs_dir = BLOBS_DIR
+_downloads = asyncio.Semaphore(MAX_PARALLEL_DOWNLOADS)
+
+
+def blob_path(sha256):
+    return os.path.join(_blobs_dir, sha256[:2], f"{sha256}.jpg")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pick_size(sizes, target_side=TARGET_SIDE):
+    """
+    Из размеров одного фото (update.message.photo) выбирает наименьший, у которого
+    длинная сторона не меньше target_side, а если такого нет — самый большой.
+    """
+    sizes = sorted(sizes, key=lambda size: max(size.width, size.height))
+    for size in sizes:
+        if max(size.width, size.height) >= target_side:
+            return size
+    return sizes[-1]
+
+
+def downscale_jpeg(src_path, dst_path, target_side=TARGET_SIDE, quality=JPEG_QUALITY):
+    """
+    Уменьшает фото до target_side по длинной стороне и пересжимает в JPEG.
+    Выполняется в пуле потоков CPU: Pillow отпускает GIL на декодировании, масштабировании
+    и кодировании JPEG, так что несколько фото уменьшаются параллельно без отдельных процессов.
+    Возвращает False, если уменьшать не нужно или нечем (нет Pillow).
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return False
+
+    with Image.open(src_path) as image:
+        if max(image.size) <= target_side:
+            return False
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((target_side, target_side), Image.LANCZOS)
+        image.save(dst_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    return True
+
+
+def lookup(file_unique_id):
+    """Путь к уже сохраненному фото по file_unique_id Telegram или None."""
+    row = storage.get_connection().execute(
+        "SELECT sha256 FROM photo_blobs WHERE file_unique_id = ?", (file_unique_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    path = blob_path(row["sha256"])
+    return path if os.path.exists(path) else None
+
+
+def ingest(tmp_path, file_unique_id, file_id=None):
+    """
+    Переносит скачанный файл в хранилище и запоминает его file_unique_id.
+    Если такое же содержимое уже есть (то же фото прислали заново), скачанная копия удаляется.
+    file_id запоминается в file_ids, чтобы потом отправлять фото без загрузки.
+    """
+    sha256 = file_sha256(tmp_path)
+    size = os.path.getsize(tmp_path)
+    path = blob_path(sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    with storage.transaction() as conn:
+        conn.execute(
+            "INSERT INTO photo_blobs (file_unique_id, sha256, size, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(file_unique_id) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size",
+            (file_unique_id, sha256, size, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+    if file_id is not None:
+        file_ids.remember(sha256, file_ids.KIND_PHOTO, file_id, file_unique_id)
+    return path
+
+
+def link(blob, dest_path):
+    """Кладет фото в папку отчета жесткой ссылкой на blob (копией, если ссылки не поддерживаются)."""
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(blob, tmp_path)
+    except OSError:
+        shutil.copyfile(blob, tmp_path)
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def _tmp_path():
+    tmp_dir = os.path.join(_blobs_dir, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return os.path.join(tmp_dir, f"{uuid.uuid4().hex}.jpg")
+
+
+def _keep_original(tmp_path):
+    sha256 = file_sha256(tmp_path)
+    path = os.path.join(_blobs_dir, "originals", sha256[:2], f"{sha256}.jpg")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+async def fetch(photo):
+    """
+    Путь к фото в хранилище. Фото с уже известным file_unique_id не скачивается повторно.
+
+    photo — список размеров из update.message.photo (скачивается размер, ближайший к TARGET_SIDE)
+    или один telegram.PhotoSize. Если скачанное фото больше TARGET_SIDE, оно уменьшается
+    и пересжимается в пуле потоков CPU; оригинал остается, только если KEEP_ORIGINALS.
+    """
+    if isinstance(photo, (list, tuple)):
+        photo = pick_size(photo)
+    blob = await run_io(lookup, photo.file_unique_id)
+    if blob is not None:
+        logger.info(f"Фото {photo.file_unique_id} уже есть в хранилище: {blob}")
+        return blob
+
+    tmp_path = _tmp_path()
+    file = await photo.get_file()
+    # Повторы, таймауты и ограничение размера; по tmp_path файл появляется только скачанным целиком
+    await downloads.download_telegram_file(file, tmp_path)
+
+    if max(photo.width or 0, photo.height or 0) > TARGET_SIDE:
+        small_path = _tmp_path()
+        try:
+            resized = await run_cpu(downscale_jpeg, tmp_path, small_path, TARGET_SIDE, JPEG_QUALITY)
+        except Exception as e:
+            logger.error(f"Не удалось уменьшить фото {photo.file_unique_id}: {e}")
+            resized = False
+        if resized:
+            if KEEP_ORIGINALS:
+                await run_io(_keep_original, tmp_path)
+            else:
+                os.remove(tmp_path)
+            tmp_path = small_path
+        elif os.path.exists(small_path):
+            os.remove(small_path)
+    return await run_io(ingest, tmp_path, photo.file_unique_id, photo.file_id)
+
+
+async def save_photo(photo, dest_path):
+    """Сохраняет фото в dest_path через хранилище: скачивание только для новых фото, на диске одна копия."""
+    blob = await fetch(photo)
+    return await run_io(link, blob, dest_path)
+
+
+async def save_photos(photos, dest_paths):
+    """Сохраняет несколько фото (например, альбом) одновременно, не больше MAX_PARALLEL_DOWNLOADS скачиваний сразу."""
+    async def save(photo, dest_path):
+        async with _downloads:
+            return await save_photo(photo, dest_path)
+
+    return await asyncio.gather(*(save(photo, dest_path) for photo, dest_path in zip(photos, dest_paths)))
+
+
+def init(blobs_dir=BLOBS_DIR):
+    global _blobs_dir
+    _blobs_dir = blobs_dir
+    os.makedirs(blobs_dir, exist_ok=True)
+    storage.get_connection().executescript(SCHEMA)
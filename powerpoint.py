@@ -3,6 +3,8 @@ from pptx.util import Inches
 import os
 import tempfile
 
+import report_meta
+
 # Путь к шаблону PowerPoint
 template_path = '/Users/nikolajusakov/PycharmProjects/PythonProject/Презентация.pptx'
 
@@ -10,7 +12,7 @@ template_path = '/Users/nikolajusakov/PycharmProjects/PythonProject/Презен
 root_directory = '/Users/nikolajusakov/PycharmProjects/PythonProject/reports'
 
 # Функция для создания презентации по шаблону
-def create_presentation_from_folder(folder_path, template_path):
+def create_presentation_from_folder(folder_path, template_path, text_content=None):
     # Открываем шаблон PowerPoint
     prs = Presentation(template_path)
 
@@ -26,13 +28,13 @@ def create_presentation_from_folder(folder_path, template_path):
     if not os.path.exists(image2_path):
         print(f"Ошибка: файл {image2_path} не найден.")
         return None
-    if not os.path.exists(text_file_path):
-        print(f"Ошибка: файл {text_file_path} не найден.")
-        return None
-
-    # Читаем текст из файла
-    with open(text_file_path, 'r', encoding='utf-8') as file:
-        text_content = file.read()
+    # Текст отчета берется из сводки месяца; report.txt читается, только если текст не передан
+    if text_content is None:
+        if not os.path.exists(text_file_path):
+            print(f"Ошибка: файл {text_file_path} не найден.")
+            return None
+        with open(text_file_path, 'r', encoding='utf-8') as file:
+            text_content = file.read()
 
     # Проходим по всем слайдам в презентации
     for slide in prs.slides:
@@ -79,6 +81,11 @@ def create_presentation_from_folder(folder_path, template_path):
                     except Exception as e:
                         print(f"Ошибка при вставке изображения 2: {e}")
 
+    # Остальные фото альбома (до_2.jpg, после_2.jpg, ...) — на дополнительных слайдах по 4
+    extra_photos = (report_meta.report_photos(folder_path, report_meta.PHOTO_BEFORE)[1:]
+                    + report_meta.report_photos(folder_path, report_meta.PHOTO_AFTER)[1:])
+    add_photo_slides(prs, extra_photos)
+
     # Сохраняем презентацию в текущей папке
     presentation_name = os.path.basename(folder_path) + '_presentation.pptx'
     output_path = os.path.join(folder_path, presentation_name)
@@ -86,6 +93,27 @@ def create_presentation_from_folder(folder_path, template_path):
     print(f"Презентация сохранена как {output_path}")
     return output_path
 
+# Функция для добавления слайдов с фото сеткой 2x2
+def add_photo_slides(prs, photo_paths, per_slide=4):
+    # Пустой макет, если он есть в шаблоне (в стандартных шаблонах это 7-й макет)
+    layout = prs.slide_layouts[6] if len(prs.slide_layouts) > 6 else prs.slide_layouts[-1]
+    margin = Inches(0.3)
+    cell_width = (prs.slide_width - 3 * margin) // 2
+    cell_height = (prs.slide_height - 3 * margin) // 2
+    for start in range(0, len(photo_paths), per_slide):
+        slide = prs.slides.add_slide(layout)
+        for i, photo_path in enumerate(photo_paths[start:start + per_slide]):
+            left = margin + (i % 2) * (cell_width + margin)
+            top = margin + (i // 2) * (cell_height + margin)
+            try:
+                picture = slide.shapes.add_picture(photo_path, left, top)
+                # Вписываем фото в ячейку с сохранением пропорций
+                scale = min(cell_width / picture.width, cell_height / picture.height)
+                picture.width = int(picture.width * scale)
+                picture.height = int(picture.height * scale)
+            except Exception as e:
+                print(f"Ошибка при вставке изображения {photo_path}: {e}")
+
 # Функция для объединения презентаций
 def merge_presentations(presentation_paths, output_path):
     merged_prs = Presentation()
@@ -122,15 +150,19 @@ def merge_presentations(presentation_paths, output_path):
     merged_prs.save(output_path)
     print(f"Объединённая презентация сохранена как {output_path}")
 
-# Рекурсивный обход папок
+# Обход отчетов по сводкам месяцев (manifest.json), без открытия каждой папки отчета
 def process_directory(directory, template_path):
     presentation_paths = []
 
-    for root, dirs, files in os.walk(directory):
-        # Если это конечная папка (нет вложенных папок)
-        if not dirs:
-            print(f"Обработка папки: {root}")
-            presentation_path = create_presentation_from_folder(root, template_path)
+    for month_dir in report_meta.iter_month_dirs(directory):
+        for name, report in sorted(report_meta.month_reports(month_dir).items()):
+            if report.get("state") == "created":
+                continue
+            folder_path = os.path.join(month_dir, name)
+            print(f"Обработка папки: {folder_path}")
+            presentation_path = create_presentation_from_folder(
+                folder_path, template_path, report_meta.render_report_txt(report)
+            )
             if presentation_path:
                 presentation_paths.append(presentation_path)
 
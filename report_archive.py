@@ -0,0 +1,264 @@
+import os
+import sys
+import shutil
+import logging
+import json
+import zipfile
+from datetime import datetime
+
+import storage
+import task_index
+import report_meta
+import report_manifest
+import report_numbers
+
+logger = logging.getLogger(__name__)
+
+# Архив закрытых месяцев: archive/<год>/<адрес>/<месяц>.zip
+ARCHIVE_DIR = "archive"
+
+# Сколько последних месяцев всегда остаются в reports/ (1 — только текущий)
+KEEP_MONTHS = 1
+
+# Каталог проекта: бот запускается из него (пути reports/ в базе относительные), там же лежит его база
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Сводка "ук" за месяц внутри архива (report_meta.render_month_summary)
+SUMMARY_FILE = "summary.txt"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_reports (
+    path TEXT PRIMARY KEY,
+    bundle TEXT NOT NULL,
+    house TEXT,
+    address TEXT,
+    work_type TEXT,
+    status TEXT,
+    created_at TEXT,
+    archived_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_archived_bundle ON archived_reports (bundle);
+"""
+
+
+def _month_key(month_dir):
+    """reports/<год>/<адрес>/<месяц> -> (год, адрес, месяц)."""
+    parts = os.path.normpath(month_dir).split(os.sep)
+    return parts[-3], parts[-2], parts[-1]
+
+
+def bundle_path(archive_dir, month_dir):
+    year, address, month = _month_key(month_dir)
+    return os.path.join(archive_dir, year, address, f"{month}.zip")
+
+
+def _report_names(month_dir):
+    with os.scandir(month_dir) as entries:
+        return {entry.name for entry in entries if entry.is_dir() and report_numbers.REPORT_DIR_RE.match(entry.name)}
+
+
+def unfinished_reports(month_dir):
+    """
+    Папки report_N месяца, которые нельзя архивировать: их нет в сводке или они не выполнены.
+    Статус берется из meta.json (report.txt) каждой папки на диске, а не из одной сводки.
+    """
+    manifest = report_manifest.load(month_dir) or {}
+    on_disk = report_meta.scan_month(month_dir)
+    return sorted(
+        name for name in _report_names(month_dir)
+        if name not in manifest or name not in on_disk or on_disk[name]["status"] != report_meta.STATUS_DONE
+    )
+
+
+def is_closed(month_dir, keep_months=KEEP_MONTHS, now=None):
+    """Месяц закрыт, если он старше keep_months последних и все его отчеты на диске выполнены."""
+    year, _, month = _month_key(month_dir)
+    now = now or datetime.now()
+    try:
+        age = (now.year * 12 + now.month) - (int(year) * 12 + int(month))
+    except ValueError:
+        return False
+    if age < keep_months:
+        return False
+    reports = report_meta.month_reports(month_dir)
+    return bool(reports) and not unfinished_reports(month_dir)
+
+
+def _remove_empty_parents(directory, stop_at):
+    stop_at = os.path.normpath(stop_at)
+    while os.path.normpath(directory) != stop_at:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def archive_month(month_dir, archive_dir=ARCHIVE_DIR, reports_dir=task_index.REPORTS_DIR):
+    """
+    Упаковывает папку месяца в один zip и удаляет ее из reports/.
+
+    Внутри zip пути вида report_N/до.jpg, так что любой файл отчета потом читается
+    по оглавлению архива без распаковки остальных. Рядом со сводкой manifest.json
+    кладется summary.txt — сводка "ук" за месяц, чтобы ее можно было получить и после архивирования. Папка удаляется только после того,
+    как архив записан, проверен и занесен в таблицу archived_reports, и только если
+    все папки отчетов на диске выполнены (проверяется до упаковки и еще раз после нее —
+    вместе с удалением, в одной транзакции).
+    """
+    unfinished = unfinished_reports(month_dir)
+    if unfinished:
+        raise ValueError(f"В {month_dir} есть невыполненные или не попавшие в сводку отчеты: {', '.join(unfinished)}.")
+    reports = report_meta.scan_month(month_dir)
+    bundle = bundle_path(archive_dir, month_dir)
+    os.makedirs(os.path.dirname(bundle), exist_ok=True)
+
+    # Месяц уже архивировали раньше (отчет добавили задним числом) — прежнее содержимое сохраняется
+    previous_reports = archived_month_reports(bundle) if os.path.exists(bundle) else {}
+
+    tmp_bundle = bundle + ".tmp"
+    all_reports = {**previous_reports, **reports}
+    year, _, month = _month_key(month_dir)
+    with zipfile.ZipFile(tmp_bundle, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        written = {report_manifest.MANIFEST_FILE, SUMMARY_FILE}
+        archive.writestr(
+            report_manifest.MANIFEST_FILE,
+            json.dumps(
+                {"version": report_manifest.MANIFEST_VERSION, "reports": all_reports},
+                ensure_ascii=False, separators=(",", ":"),
+            ),
+        )
+        archive.writestr(SUMMARY_FILE, report_meta.render_month_summary(year, month, all_reports))
+        for root, _, files in os.walk(month_dir):
+            for name in files:
+                if name in (report_manifest.LOCK_FILE, report_manifest.MANIFEST_FILE) and root == month_dir:
+                    continue
+                path = os.path.join(root, name)
+                member = os.path.relpath(path, month_dir).replace(os.sep, "/")
+                archive.write(path, member)
+                written.add(member)
+        if previous_reports:
+            with zipfile.ZipFile(bundle) as previous:
+                for info in previous.infolist():
+                    if info.filename not in written:
+                        archive.writestr(info, previous.read(info))
+    with zipfile.ZipFile(tmp_bundle) as archive:
+        broken = archive.testzip()
+    if broken is not None:
+        os.remove(tmp_bundle)
+        raise zipfile.BadZipFile(f"Файл {broken} в архиве {bundle} поврежден.")
+    archived_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Последняя проверка и удаление папки — один шаг под транзакцией BEGIN IMMEDIATE: выдача номеров,
+    # создание отчетов и переходы состояний тоже идут в транзакции, поэтому между проверкой
+    # и удалением ни один отчет месяца не может появиться или открыться заново
+    try:
+        with storage.transaction() as conn:
+            # Пока шла упаковка, в месяц могли добавить отчет или открыть задачу заново
+            unfinished = unfinished_reports(month_dir)
+            if unfinished or _report_names(month_dir) - set(reports):
+                raise ValueError(f"{month_dir} изменился во время архивирования, папка не удалена.")
+            os.replace(tmp_bundle, bundle)
+            conn.executemany(
+                "INSERT INTO archived_reports (path, bundle, house, address, work_type, status, created_at, archived_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET bundle = excluded.bundle, status = excluded.status, "
+                "archived_at = excluded.archived_at",
+                [
+                    (
+                        os.path.normpath(os.path.join(month_dir, name)), bundle, report["house"],
+                        report_meta.address_from_path(os.path.join(month_dir, name)),
+                        report["work_type"], report["status"], report.get("created_at"), archived_at,
+                    )
+                    for name, report in reports.items()
+                ],
+            )
+            shutil.rmtree(month_dir)
+            task_index.remove_tasks_under(month_dir)
+    finally:
+        if os.path.exists(tmp_bundle):
+            os.remove(tmp_bundle)
+    _remove_empty_parents(os.path.dirname(month_dir), reports_dir)
+    logger.info(f"Месяц {month_dir} перенесен в архив {bundle}: {len(reports)} отчетов.")
+    return bundle
+
+
+def archive_closed_months(reports_dir=task_index.REPORTS_DIR, archive_dir=ARCHIVE_DIR, keep_months=KEEP_MONTHS):
+    """Архивирует все закрытые месяцы. Возвращает число созданных архивов."""
+    archived = 0
+    for month_dir in list(report_meta.iter_month_dirs(reports_dir)):
+        try:
+            if is_closed(month_dir, keep_months):
+                archive_month(month_dir, archive_dir, reports_dir)
+                archived += 1
+        except Exception as e:
+            logger.error(f"Ошибка при архивировании {month_dir}: {e}")
+    logger.info(f"Архивировано месяцев: {archived}.")
+    return archived
+
+
+def archived_month_reports(bundle):
+    """Отчеты месяца из сводки внутри архива: {"report_N": поля}."""
+    with zipfile.ZipFile(bundle) as archive:
+        try:
+            manifest = json.loads(archive.read(report_manifest.MANIFEST_FILE))
+        except KeyError:
+            return {}
+    return manifest.get("reports", {})
+
+
+def month_summary(month_dir, archive_dir=ARCHIVE_DIR):
+    """
+    Сводка "ук" за месяц: из сводки месяца в reports/, а для перенесенного в архив месяца — из архива.
+    None, если за месяц нет ни папки, ни архива.
+    """
+    if os.path.isdir(month_dir):
+        return report_meta.month_summary(month_dir)
+    bundle = bundle_path(archive_dir, month_dir)
+    if not os.path.exists(bundle):
+        return None
+    with zipfile.ZipFile(bundle) as archive:
+        try:
+            return archive.read(SUMMARY_FILE).decode("utf-8")
+        except KeyError:
+            pass
+    # Архив, собранный до появления summary.txt
+    year, _, month = _month_key(month_dir)
+    return report_meta.render_month_summary(year, month, archived_month_reports(bundle))
+
+
+def find_archived(report_dir):
+    """Запись об отчете в архиве или None."""
+    row = storage.get_connection().execute(
+        "SELECT path, bundle, house, address, work_type, status, created_at, archived_at "
+        "FROM archived_reports WHERE path = ?",
+        (os.path.normpath(report_dir),),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def read_archived_file(report_dir, name):
+    """Читает один файл отчета (например, "после.jpg" или "report.pdf") прямо из архива месяца."""
+    record = find_archived(report_dir)
+    if record is None:
+        raise FileNotFoundError(f"Отчет {report_dir} не найден в архиве.")
+    member = f"{os.path.basename(os.path.normpath(report_dir))}/{name}"
+    with zipfile.ZipFile(record["bundle"]) as archive:
+        return archive.read(member)
+
+
+def init():
+    storage.get_connection().executescript(SCHEMA)
+
+
+if __name__ == '__main__':
+    # Периодический запуск: python report_archive.py [папка_отчетов] [папка_архива]
+    # Пути считаются от каталога проекта, как у бота, из какого бы каталога ни запускали
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    os.chdir(PROJECT_DIR)
+    storage.init(os.path.join(PROJECT_DIR, storage.DB_PATH))
+    task_index.init(sys.argv[1] if len(sys.argv) > 1 else task_index.REPORTS_DIR)
+    init()
+    archive_closed_months(
+        sys.argv[1] if len(sys.argv) > 1 else task_index.REPORTS_DIR,
+        sys.argv[2] if len(sys.argv) > 2 else ARCHIVE_DIR,
+    )
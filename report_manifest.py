@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+# Блокировка файла между процессами есть только в Unix; без нее защищаемся только внутри процесса
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Сводка папки месяца: reports/<год>/<адрес>/<месяц>/manifest.json
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "manifest.lock"
+MANIFEST_VERSION = 1
+
+_lock = threading.Lock()
+
+
+def month_dir_of(report_dir):
+    return os.path.dirname(os.path.normpath(report_dir))
+
+
+@contextmanager
+def _locked(month_dir):
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(month_dir, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load(month_dir):
+    """Отчеты месяца {"report_N": поля} одним чтением или None, если сводки нет."""
+    try:
+        with open(os.path.join(month_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.error(f"Сводка {month_dir} повреждена: {e}")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest["reports"]
+
+
+def _write(month_dir, reports):
+    path = os.path.join(month_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "reports": reports}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def write(month_dir, reports):
+    """Полностью перезаписывает сводку месяца."""
+    with _locked(month_dir):
+        _write(month_dir, reports)
+
+
+def put(report_dir, entry, scan=None):
+    """
+    Добавляет или обновляет отчет в сводке его месяца.
+    Если сводки еще нет, а в папке месяца уже есть другие отчеты, сводка сначала
+    собирается обходом папки: scan(month_dir) -> {"report_N": поля}. Иначе в ней
+    оказался бы один сохраняемый отчет.
+    """
+    month_dir = month_dir_of(report_dir)
+    with _locked(month_dir):
+        reports = load(month_dir)
+        if reports is None:
+            reports = scan(month_dir) if scan is not None else {}
+        reports[os.path.basename(os.path.normpath(report_dir))] = entry
+        _write(month_dir, reports)
+
+
+def remove(report_dir):
+    """Убирает отчет из сводки его месяца."""
+    month_dir = month_dir_of(report_dir)
+    if not os.path.isdir(month_dir):
+        return
+    with _locked(month_dir):
+        reports = load(month_dir)
+        if reports and reports.pop(os.path.basename(os.path.normpath(report_dir)), None) is not None:
+            _write(month_dir, reports)
@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import report_manifest
+
+logger = logging.getLogger(__name__)
+
+# Машиночитаемые данные отчета лежат рядом с report.txt: reports/<год>/<адрес>/<месяц>/report_N/meta.json
+META_FILE = "meta.json"
+REPORT_FILE = "report.txt"
+META_VERSION = 1
+
+# Статусы, как они пишутся в report.txt
+STATUS_OPEN = "не выполнено"
+STATUS_DONE = "выполнено"
+
+# Поля отчета, которые попадают в сводку месяца (manifest.json)
+MANIFEST_FIELDS = (
+    "house", "work_type", "work_data", "status", "state", "uk", "owner", "last_editor", "created_at", "updated_at",
+)
+
+# Фото этапов в папке отчета: до.jpg, до_2.jpg, ..., после.jpg, после_2.jpg, ...
+PHOTO_BEFORE = "до"
+PHOTO_AFTER = "после"
+
+# Подписи полей в report.txt
+LABELS = {
+    "house": "Номер дома",
+    "work_type": "Тип работ",
+    "work_data": "Данные",
+    "status": "Статус",
+    "uk": "ук",
+}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def uk_line(now=None):
+    """Значение поля "ук" за текущий месяц."""
+    month_year = (now or datetime.now()).strftime("%m.%Y")
+    return f"Проведенные работы в МКД и на придомовой территории за {month_year}"
+
+
+def address_from_path(report_dir):
+    """Адрес берется из пути reports/<год>/<адрес>/<месяц>/report_N."""
+    parts = os.path.normpath(report_dir).split(os.sep)
+    return parts[-3] if len(parts) >= 4 else None
+
+
+def photo_name(stage, index):
+    """Имя index-го фото этапа (с 1): первое — "до.jpg", следующие — "до_2.jpg" и т.д."""
+    return f"{stage}.jpg" if index == 1 else f"{stage}_{index}.jpg"
+
+
+def _photo_index(stage, name):
+    if name == f"{stage}.jpg":
+        return 1
+    prefix = f"{stage}_"
+    if name.startswith(prefix) and name.endswith(".jpg") and name[len(prefix):-4].isdigit():
+        return int(name[len(prefix):-4])
+    return None
+
+
+def report_photos(report_dir, stage):
+    """Пути к фото этапа в папке отчета по порядку номеров."""
+    photos = []
+    for name in os.listdir(report_dir):
+        index = _photo_index(stage, name)
+        if index is not None:
+            photos.append((index, os.path.join(report_dir, name)))
+    return [path for _, path in sorted(photos)]
+
+
+def remove_photos(report_dir, stage):
+    """Удаляет фото этапа (перед тем как сохранить новые)."""
+    for path in report_photos(report_dir, stage):
+        os.remove(path)
+
+
+def staged_photo_paths(report_dir, count):
+    """
+    Временные пути в папке отчета для count новых фото. Под такими именами фото еще
+    не считаются фото отчета: на места их переносит report_state.store_photos.
+    """
+    return [os.path.join(report_dir, f".photo.{uuid.uuid4().hex}.part") for _ in range(count)]
+
+
+def discard_staged(paths):
+    """Удаляет временные фото, которые так и не были перенесены на места."""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def new_meta(report_dir, house, work_type, work_data=None, owner=None, status=STATUS_OPEN, uk=None):
+    now = _now()
+    return {
+        "version": META_VERSION,
+        "house": str(house),
+        "address": address_from_path(report_dir),
+        "work_type": work_type,
+        "work_data": work_data,
+        "status": status,
+        "uk": uk,
+        "owner": owner,
+        "last_editor": owner,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def render_report_txt(meta):
+    """report.txt — человекочитаемый вид отчета, собирается из meta.json."""
+    lines = [
+        f"{LABELS['house']}: {meta['house']}",
+        f"{LABELS['work_type']}: {meta['work_type']}",
+    ]
+    if meta.get("work_data") is not None:
+        lines.append(f"{LABELS['work_data']}: {meta['work_data']}")
+    lines.append(f"{LABELS['status']}: {meta['status']}")
+    if meta.get("uk"):
+        lines.append(f"{LABELS['uk']}: {meta['uk']}")
+    return "".join(f"{line}\n" for line in lines)
+
+
+def parse_report_txt(text):
+    """
+    Разбирает старый report.txt по подписям полей, а не по номерам строк.
+    Возвращает поля отчета или None, если нет номера дома или типа работ.
+    """
+    by_label = {label: key for key, label in LABELS.items()}
+    fields = {}
+    for line in text.split("\n"):
+        label, sep, value = line.partition(": ")
+        if sep and label.strip() in by_label:
+            fields.setdefault(by_label[label.strip()], value.strip())
+    if "house" not in fields or "work_type" not in fields:
+        return None
+    # Статус в старых отчетах мог быть записан как угодно — ищем "не выполнено", как раньше
+    fields["status"] = STATUS_OPEN if STATUS_OPEN in text else STATUS_DONE
+    return fields
+
+
+def manifest_entry(meta):
+    return {key: meta.get(key) for key in MANIFEST_FIELDS}
+
+
+def _write_atomic(path, text):
+    # Уникальное временное имя: load_or_migrate может писать тот же файл вне транзакции
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _write_meta(report_dir, meta):
+    _write_atomic(os.path.join(report_dir, META_FILE), json.dumps(meta, ensure_ascii=False, separators=(",", ":")))
+
+
+def _text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def save(report_dir, meta):
+    """
+    Перерисовывает report.txt по meta и записывает meta.json (каждый файл подменяется целиком).
+    updated_at выставляется здесь. Пока у задачи нет фото "до" (state "created"),
+    report.txt не пишется — такая папка еще не считается отчетом.
+
+    В meta.json запоминается sha256 записанного report.txt (report_sha256): по нему load_current
+    отличает ручную правку от собственной записи. report.txt пишется первым, поэтому после
+    падения между записями новый report.txt просто перенесется в meta.json как правка.
+    Запись отчета в сводке месяца обновляется следом.
+    """
+    meta["updated_at"] = _now()
+    if meta.get("state") != "created":
+        text = render_report_txt(meta)
+        _write_atomic(os.path.join(report_dir, REPORT_FILE), text)
+        meta["report_sha256"] = _text_sha256(text)
+    _write_meta(report_dir, meta)
+    report_manifest.put(report_dir, manifest_entry(meta), scan=scan_month)
+    return meta
+
+
+def load(report_dir):
+    """meta.json отчета одним чтением или None, если его нет или он другой версии."""
+    try:
+        with open(os.path.join(report_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta.get("version") != META_VERSION:
+        return None
+    return meta
+
+
+def meta_from_report_txt(report_dir):
+    """Собирает meta из старого report.txt. Время создания — mtime файла."""
+    text_file_path = os.path.join(report_dir, REPORT_FILE)
+    with open(text_file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    fields = parse_report_txt(text)
+    if fields is None:
+        return None
+    meta = new_meta(
+        report_dir, fields["house"], fields["work_type"], fields.get("work_data"),
+        status=fields["status"], uk=fields.get("uk"),
+    )
+    meta["report_sha256"] = _text_sha256(text)
+    created = datetime.fromtimestamp(os.stat(text_file_path).st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+    meta["created_at"] = meta["updated_at"] = created
+    return meta
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_current(report_dir):
+    """
+    meta отчета с учетом ручных правок report.txt.
+
+    report.txt правят вручную, а meta.json — нет, поэтому если report.txt отличается от
+    записанного ботом (sha256 не совпадает с report_sha256 в meta.json), его поля (дом, тип работ,
+    данные, статус, ук) переносятся в meta.json. Статус, исправленный на "выполнено",
+    закрывает задачу, а на "не выполнено" — снова открывает ее. Для meta.json без report_sha256
+    (записанных до его появления) правкой считается report.txt новее meta.json.
+    """
+    meta = load(report_dir)
+    if meta is None:
+        return None
+    text_path = os.path.join(report_dir, REPORT_FILE)
+    try:
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return meta
+    if meta.get("report_sha256"):
+        if _text_sha256(text) == meta["report_sha256"]:
+            return meta
+    else:
+        meta_mtime = _mtime_ns(os.path.join(report_dir, META_FILE))
+        text_mtime = _mtime_ns(text_path)
+        if meta_mtime is None or text_mtime is None or text_mtime <= meta_mtime:
+            return meta
+    fields = parse_report_txt(text)
+    if fields is None:
+        return meta
+    changed = {key: value for key, value in fields.items() if meta.get(key) != value}
+    if not changed:
+        # Правка не задела полей (или это собственная запись без хэша): файл не перерисовывается,
+        # запоминается только его хэш, чтобы не разбирать его снова
+        meta["report_sha256"] = _text_sha256(text)
+        _write_meta(report_dir, meta)
+        return meta
+    meta.update(changed)
+    if "status" in changed:
+        if meta["status"] == STATUS_DONE:
+            meta["state"] = "completed"
+        elif meta.get("state") == "completed":
+            meta["state"] = "awaiting_after"
+    logger.info(f"В {report_dir} перенесены ручные правки report.txt: {', '.join(sorted(changed))}")
+    return save(report_dir, meta)
+
+
+def load_or_migrate(report_dir):
+    """meta отчета; для отчета без meta.json он создается из report.txt."""
+    meta = load(report_dir)
+    if meta is None and os.path.exists(os.path.join(report_dir, REPORT_FILE)):
+        meta = meta_from_report_txt(report_dir)
+        if meta is not None:
+            _write_meta(report_dir, meta)
+            report_manifest.put(report_dir, manifest_entry(meta), scan=scan_month)
+    return meta
+
+
+def load_required(report_dir):
+    meta = load_or_migrate(report_dir)
+    if meta is None:
+        raise FileNotFoundError(f"В {report_dir} нет ни {META_FILE}, ни разборчивого {REPORT_FILE}.")
+    return meta
+
+
+def update(report_dir, **fields):
+    """Меняет поля отчета и сохраняет его."""
+    meta = load_required(report_dir)
+    meta.update(fields)
+    return save(report_dir, meta)
+
+
+def scan_month(month_dir):
+    """Отчеты папки месяца {"report_N": поля}, прочитанные с диска, без записи сводки."""
+    reports = {}
+    with os.scandir(month_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            meta = load(entry.path)
+            if meta is None and os.path.exists(os.path.join(entry.path, REPORT_FILE)):
+                meta = meta_from_report_txt(entry.path)
+            if meta is not None:
+                reports[entry.name] = manifest_entry(meta)
+    return reports
+
+
+def rebuild_manifest(month_dir):
+    """Пересобирает сводку месяца из meta.json (и report.txt еще не перенесенных) отчетов."""
+    reports = scan_month(month_dir)
+    report_manifest.write(month_dir, reports)
+    return reports
+
+
+def month_reports(month_dir):
+    """
+    Отчеты папки месяца {"report_N": поля} из одной сводки.
+    Если сводки еще нет, она собирается один раз обходом папки.
+    """
+    reports = report_manifest.load(month_dir)
+    if reports is None:
+        if not os.path.isdir(month_dir):
+            return {}
+        reports = rebuild_manifest(month_dir)
+    return reports
+
+
+def iter_month_dirs(reports_dir):
+    """Папки месяцев reports/<год>/<адрес>/<месяц> без захода в папки отчетов."""
+    for year in sorted(os.scandir(reports_dir), key=lambda e: e.name):
+        if not year.is_dir():
+            continue
+        for address in sorted(os.scandir(year.path), key=lambda e: e.name):
+            if not address.is_dir():
+                continue
+            for month in sorted(os.scandir(address.path), key=lambda e: e.name):
+                if month.is_dir():
+                    yield month.path
+
+
+def render_month_summary(year, month, reports):
+    """
+    Сводка "ук" за месяц по адресу: строка "ук: Проведенные работы ... за MM.YYYY"
+    и выполненные работы по одной на строку. reports — {"report_N": поля} из сводки месяца.
+    """
+    done = [
+        report for _, report in sorted(reports.items(), key=lambda item: _report_number(item[0]))
+        if report["status"] == STATUS_DONE
+    ]
+    lines = [f"{LABELS['uk']}: {uk_line(datetime(int(year), int(month), 1))}"]
+    lines.extend(f"Дом №{report['house']}: {report['work_type']}" for report in done)
+    return "".join(f"{line}\n" for line in lines)
+
+
+def month_summary(month_dir):
+    """Сводка "ук" за месяц по папке reports/<год>/<адрес>/<месяц>: читается одна сводка месяца."""
+    year, month = os.path.basename(os.path.dirname(os.path.dirname(month_dir))), os.path.basename(month_dir)
+    return render_month_summary(year, month, month_reports(month_dir))
+
+
+def _report_number(name):
+    _, _, number = name.rpartition("_")
+    return int(number) if number.isdigit() else 0
+
+
+def _migrate_one(report_dir):
+    try:
+        if load(report_dir) is not None:
+            return False
+        return load_or_migrate(report_dir) is not None
+    except Exception as e:
+        logger.error(f"Ошибка при переносе {report_dir}: {e}")
+        return False
+
+
+def migrate(reports_dir, workers=8):
+    """
+    Создает meta.json для всех отчетов в reports_dir, у которых его еще нет,
+    и пересобирает сводки месяцев. Файлы читаются и пишутся параллельно; report.txt не меняется.
+    """
+    report_dirs, month_dirs = [], set()
+    for root, _, files in os.walk(reports_dir):
+        if REPORT_FILE in files:
+            month_dirs.add(os.path.dirname(root))
+            if META_FILE not in files:
+                report_dirs.append(root)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        migrated = sum(pool.map(_migrate_one, report_dirs))
+        list(pool.map(rebuild_manifest, month_dirs))
+    logger.info(
+        f"Перенесено отчетов в {META_FILE}: {migrated} из {len(report_dirs)}, "
+        f"сводок месяцев пересобрано: {len(month_dirs)}."
+    )
+    return migrated
+
+
+if __name__ == '__main__':
+    # Разовый перенос: python report_meta.py [папка_отчетов]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    migrate(sys.argv[1] if len(sys.argv) > 1 else "reports")
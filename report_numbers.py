@@ -0,0 +1,116 @@
+import os
+import re
+import shutil
+import logging
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_counters (
+    year TEXT NOT NULL,
+    address TEXT NOT NULL,
+    month TEXT NOT NULL,
+    last_number INTEGER NOT NULL,
+    PRIMARY KEY (year, address, month)
+);
+
+CREATE TABLE IF NOT EXISTS released_report_numbers (
+    year TEXT NOT NULL,
+    address TEXT NOT NULL,
+    month TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (year, address, month, number)
+);
+"""
+
+REPORT_DIR_RE = re.compile(r"^report_(\d+)$")
+
+
+def _max_number_on_disk(base_dir):
+    """Наибольший номер report_N в папке месяца (0, если папки нет)."""
+    last = 0
+    try:
+        with os.scandir(base_dir) as entries:
+            for entry in entries:
+                match = REPORT_DIR_RE.match(entry.name)
+                if match and entry.is_dir():
+                    last = max(last, int(match.group(1)))
+    except FileNotFoundError:
+        pass
+    return last
+
+
+def create_report_dir(reports_dir, year, address, month):
+    """
+    Выдает следующий номер отчета для (год, адрес, месяц) и создает папку report_N.
+
+    Номер берется из счетчика в базе под BEGIN IMMEDIATE, поэтому два обработчика
+    или два процесса бота никогда не получат одну и ту же папку. Папка месяца
+    просматривается только один раз, когда счетчика для нее еще нет.
+    Сначала занимаются номера, освобожденные release_report_dir.
+    """
+    base_dir = os.path.join(reports_dir, year, address, month)
+    with storage.transaction() as conn:
+        released = conn.execute(
+            "SELECT number FROM released_report_numbers WHERE year = ? AND address = ? AND month = ? "
+            "ORDER BY number",
+            (year, address, month),
+        ).fetchall()
+        for row in released:
+            conn.execute(
+                "DELETE FROM released_report_numbers WHERE year = ? AND address = ? AND month = ? AND number = ?",
+                (year, address, month, row["number"]),
+            )
+            report_dir = os.path.join(base_dir, f"report_{row['number']}")
+            try:
+                os.makedirs(report_dir)
+                return report_dir
+            except FileExistsError:
+                continue
+
+        row = conn.execute(
+            "SELECT last_number FROM report_counters WHERE year = ? AND address = ? AND month = ?",
+            (year, address, month),
+        ).fetchone()
+        number = (row["last_number"] if row else _max_number_on_disk(base_dir)) + 1
+
+        os.makedirs(base_dir, exist_ok=True)
+        while True:
+            report_dir = os.path.join(base_dir, f"report_{number}")
+            try:
+                os.mkdir(report_dir)
+                break
+            except FileExistsError:
+                # Папку создали вручную в обход счетчика — берем следующий номер
+                number += 1
+
+        conn.execute(
+            "INSERT INTO report_counters (year, address, month, last_number) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(year, address, month) DO UPDATE SET last_number = excluded.last_number",
+            (year, address, month, number),
+        )
+    return report_dir
+
+
+def release_report_dir(report_dir):
+    """
+    Удаляет папку отчета и возвращает ее номер в пул, чтобы create_report_dir выдал его снова.
+    Удаление и возврат номера идут в одной транзакции с выдачей номеров.
+    """
+    parts = os.path.normpath(report_dir).split(os.sep)
+    match = REPORT_DIR_RE.match(parts[-1])
+    if len(parts) < 5 or not match:
+        raise ValueError(f"{report_dir} не похож на папку отчета reports/<год>/<адрес>/<месяц>/report_N.")
+    year, address, month = parts[-4], parts[-3], parts[-2]
+    with storage.transaction() as conn:
+        shutil.rmtree(report_dir)
+        conn.execute(
+            "INSERT OR IGNORE INTO released_report_numbers (year, address, month, number) VALUES (?, ?, ?, ?)",
+            (year, address, month, int(match.group(1))),
+        )
+
+
+def init():
+    storage.get_connection().executescript(SCHEMA)
@@ -0,0 +1,81 @@
+import os
+
+import report_meta
+
+# Размер ячейки под одно фото (мм): две колонки "до" и "после" на листе A4
+PHOTO_BOX_W = 90
+PHOTO_BOX_H = 70
+PAGE_BOTTOM = 280
+
+PDF_FILE = "report.pdf"
+
+
+def _fit(path, box_w, box_h):
+    """Размер фото в ячейке с сохранением пропорций; без Pillow — по ширине ячейки."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return box_w, 0
+    with Image.open(path) as image:
+        width, height = image.size
+    scale = min(box_w / width, box_h / height)
+    return width * scale, height * scale
+
+
+def is_current(report_dir):
+    """
+    report.pdf новее meta.json и всех фото отчета. fpdf пишет в PDF время создания,
+    поэтому отчет, пересобранный без изменений для повторной отправки (/my_reports),
+    был бы другим файлом и загружался в Telegram заново, а не уходил по file_id.
+    """
+    try:
+        pdf_mtime = os.stat(os.path.join(report_dir, PDF_FILE)).st_mtime_ns
+        sources = [os.path.join(report_dir, report_meta.META_FILE)]
+        sources += report_meta.report_photos(report_dir, report_meta.PHOTO_BEFORE)
+        sources += report_meta.report_photos(report_dir, report_meta.PHOTO_AFTER)
+        # Фото — жесткие ссылки на старые файлы хранилища: их mtime не меняется, а ctime меняется при создании ссылки
+        return all(max(os.stat(path).st_mtime_ns, os.stat(path).st_ctime_ns) <= pdf_mtime for path in sources)
+    except FileNotFoundError:
+        return False
+
+
+def render_report_pdf(report_dir, house_number, work_type, font_path):
+    """
+    Собирает report.pdf: слева фото "до", справа фото "после", по одному фото в строке,
+    сколько бы их ни было. Если отчет не менялся с прошлой сборки, отдается прежний PDF.
+    Возвращает путь к PDF.
+    """
+    pdf_output = os.path.join(report_dir, PDF_FILE)
+    if is_current(report_dir):
+        return pdf_output
+
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font("DejaVu", "", font_path, uni=True)
+    pdf.set_font("DejaVu", size=12)
+
+    pdf.cell(200, 10, txt=f"Номер дома: {house_number}", ln=True)
+    pdf.cell(200, 10, txt=f"Тип работ: {work_type}", ln=True)
+    pdf.cell(200, 10, txt="Статус: выполнено", ln=True)
+
+    columns = (
+        (10, report_meta.report_photos(report_dir, report_meta.PHOTO_BEFORE)),
+        (110, report_meta.report_photos(report_dir, report_meta.PHOTO_AFTER)),
+    )
+    y = 50
+    for row in range(max(len(photos) for _, photos in columns)):
+        if y + PHOTO_BOX_H > PAGE_BOTTOM:
+            pdf.add_page()
+            y = 10
+        for x, photos in columns:
+            if row < len(photos):
+                w, h = _fit(photos[row], PHOTO_BOX_W, PHOTO_BOX_H)
+                pdf.image(photos[row], x=x, y=y, w=w, h=h)
+        y += PHOTO_BOX_H + 5
+
+    tmp_output = pdf_output + ".tmp"
+    pdf.output(tmp_output)
+    os.replace(tmp_output, pdf_output)
+    return pdf_output
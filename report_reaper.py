@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+import threading
+
+import storage
+import task_index
+import report_meta
+import report_manifest
+import report_numbers
+
+logger = logging.getLogger(__name__)
+
+# Папка без фото старше этого возраста считается брошенной (секунды)
+MAX_AGE = 24 * 60 * 60
+# Как часто искать брошенные папки (секунды)
+REAP_INTERVAL = 60 * 60
+
+# Файлы, наличие которых значит, что по отчету уже что-то сделано
+PHOTO_FILES = ("до.jpg", "после.jpg")
+
+
+def _is_orphan(report_dir, entry, max_age, now):
+    """Папка отчета без фото, без meta.json или с задачей, так и не получившей фото "до"."""
+    if entry is not None and entry.get("state") != "created":
+        return False
+    try:
+        names = set(os.listdir(report_dir))
+    except FileNotFoundError:
+        return False
+    if any(name in names for name in PHOTO_FILES) or report_meta.REPORT_FILE in names:
+        return False
+    if report_meta.META_FILE in names:
+        meta = report_meta.load(report_dir)
+        if meta is None or meta.get("state") != "created":
+            return False
+    return now - os.stat(report_dir).st_mtime > max_age
+
+
+class ReportReaper:
+    """
+    Фоновая уборка папок отчетов, брошенных до первого фото.
+
+    Папка создается при выборе типа работ; если разговор на этом закончился, в ней
+    нет ни фото, ни report.txt. Такие папки старше max_age удаляются, а их номера
+    возвращаются в report_numbers и будут выданы следующим отчетам.
+    """
+
+    def __init__(self, reports_dir=task_index.REPORTS_DIR, max_age=MAX_AGE, interval=REAP_INTERVAL):
+        self.reports_dir = reports_dir
+        self.max_age = max_age
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reap(self):
+        """Один проход уборки. Возвращает число удаленных папок."""
+        now = time.time()
+        removed = 0
+        for month_dir in report_meta.iter_month_dirs(self.reports_dir):
+            # По сводке месяца сразу отсеиваются отчеты, у которых уже есть фото
+            manifest = report_manifest.load(month_dir) or {}
+            with os.scandir(month_dir) as entries:
+                report_dirs = [
+                    (entry.path, manifest.get(entry.name)) for entry in entries
+                    if entry.is_dir() and report_numbers.REPORT_DIR_RE.match(entry.name)
+                ]
+            for report_dir, entry in report_dirs:
+                try:
+                    # Проверка и удаление — в одной транзакции с выдачей номеров и переходами report_state:
+                    # переход задачи не проскочит между проверкой и удалением, а номер не выдается, пока папка проверяется
+                    with storage.transaction():
+                        if not _is_orphan(report_dir, entry, self.max_age, now):
+                            continue
+                        report_numbers.release_report_dir(report_dir)
+                        report_manifest.remove(report_dir)
+                    removed += 1
+                except Exception as e:
+                    logger.error(f"Ошибка при удалении брошенной папки {report_dir}: {e}")
+        logger.info(f"Удалено брошенных папок отчетов: {removed}.")
+        return removed
+
+    def _run(self):
+        while True:
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"Ошибка при уборке папки отчетов: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="report-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
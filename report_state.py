@@ -0,0 +1,154 @@
+import os
+import logging
+
+import storage
+import report_meta
+import task_index
+
+logger = logging.getLogger(__name__)
+
+# Состояния задачи (поле "state" в meta.json)
+STATE_CREATED = "created"                # папка выделена, фото "до" еще нет
+STATE_BEFORE_PHOTO = "before_photo"      # фото "до" сохранено
+STATE_AWAITING_AFTER = "awaiting_after"  # пользователь отложил фото "после"
+STATE_COMPLETED = "completed"            # фото "после" сохранено, работа выполнена
+
+# Разрешенные переходы: состояние -> куда из него можно перейти
+TRANSITIONS = {
+    STATE_CREATED: {STATE_BEFORE_PHOTO},
+    STATE_BEFORE_PHOTO: {STATE_AWAITING_AFTER, STATE_COMPLETED},
+    STATE_AWAITING_AFTER: {STATE_AWAITING_AFTER, STATE_COMPLETED},
+    STATE_COMPLETED: set(),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def state_of(meta):
+    """Состояние задачи; для отчетов, перенесенных из report.txt, выводится из статуса."""
+    if meta.get("state"):
+        return meta["state"]
+    return STATE_COMPLETED if meta["status"] == report_meta.STATUS_DONE else STATE_AWAITING_AFTER
+
+
+def status_of(state):
+    """Статус для report.txt и индекса задач."""
+    return report_meta.STATUS_DONE if state == STATE_COMPLETED else report_meta.STATUS_OPEN
+
+
+def _current_state(report_dir, owner=None):
+    """
+    Состояние задачи или None, когда папки или meta.json уже нет (папку убрал ReportReaper),
+    и когда задан owner, а у задачи другой владелец: номер убранной папки мог достаться чужому отчету.
+    """
+    try:
+        meta = report_meta.load_or_migrate(report_dir)
+    except FileNotFoundError:
+        return None
+    if meta is None:
+        return None
+    if owner is not None and meta.get("owner") not in (None, owner):
+        return None
+    return state_of(meta)
+
+
+def can_transition(report_dir, to_state, owner=None):
+    """Разрешен ли сейчас переход в to_state; False и для удаленной или чужой папки (см. _current_state)."""
+    current = _current_state(report_dir, owner)
+    return current is not None and to_state in TRANSITIONS[current]
+
+
+def can_store_photos(report_dir, to_state, owner=None):
+    """
+    Можно ли сохранить фото этапа, который переводит задачу в to_state: переход разрешен
+    или этап уже принят и фото добавляются к нему (см. store_photos). Обработчики
+    проверяют это до скачивания фото; окончательная проверка — в store_photos.
+    """
+    current = _current_state(report_dir, owner)
+    return current is not None and (current == to_state or to_state in TRANSITIONS[current])
+
+
+def create(report_dir, house, work_type, work_data=None, owner=None, uk=None):
+    """Заводит задачу в состоянии created. В индекс она попадет после фото "до"."""
+    meta = report_meta.new_meta(report_dir, house, work_type, work_data, owner=owner, uk=uk)
+    meta["state"] = STATE_CREATED
+    with storage.transaction():
+        return report_meta.save(report_dir, meta)
+
+
+def transition(report_dir, to_state, editor=None, defaults=None, **fields):
+    """
+    Переводит задачу в состояние to_state.
+
+    Переход — одна атомарная запись meta.json; report.txt перерисовывается по ней,
+    индекс задач обновляется следом. Чтение состояния, проверка перехода и запись идут
+    в одной транзакции BEGIN IMMEDIATE, поэтому два одновременных перехода (обработчик
+    и фоновый поток или другой процесс бота) выполняются по очереди, и второй видит
+    состояние, оставленное первым. editor — Telegram id пользователя, сделавшего переход,
+    он записывается в last_editor. fields перезаписывают поля отчета,
+    defaults заполняют только отсутствующие.
+    """
+    with storage.transaction():
+        meta = report_meta.load_required(report_dir)
+        current = state_of(meta)
+        if to_state not in TRANSITIONS[current]:
+            raise InvalidTransition(f"{report_dir}: переход {current} -> {to_state} не разрешен.")
+
+        for key, value in (defaults or {}).items():
+            if not meta.get(key):
+                meta[key] = value
+        meta.update(fields)
+        if editor is not None:
+            meta["last_editor"] = editor
+        meta["state"] = to_state
+        meta["status"] = status_of(to_state)
+        report_meta.save(report_dir, meta)
+
+        if current == STATE_CREATED:
+            task_index.record_task(
+                report_dir, meta["house"], meta["work_type"], meta["status"],
+                meta.get("owner"), meta.get("created_at"), meta.get("last_editor"),
+            )
+        else:
+            task_index.set_status(report_dir, meta["status"], meta.get("last_editor"))
+    logger.info(f"Задача {report_dir}: {current} -> {to_state}")
+    return meta
+
+
+def store_photos(report_dir, stage, staged, to_state, editor=None, owner=None, defaults=None):
+    """
+    Переносит скачанные фото этапа (staged — временные файлы из report_meta.staged_photo_paths)
+    на места до.jpg, до_2.jpg, ... и переводит задачу в to_state. Проверка состояния,
+    перенос фото и переход идут в одной транзакции, поэтому отклоненный переход не трогает
+    фото, а два пакета фото одного этапа (Telegram делит альбом больше 10 фото на несколько
+    групп, фото можно дослать и после альбома) сохраняются по очереди.
+
+    Если этап уже принят (задача уже в to_state), фото добавляются к сохраненным, без перехода.
+    Иначе прежние фото этапа, если они остались, заменяются; defaults передаются в transition.
+    Возвращает пути сохраненных фото; InvalidTransition, если сохранить фото нельзя (см. can_store_photos).
+    """
+    with storage.transaction():
+        current = _current_state(report_dir, owner)
+        if current is None or (current != to_state and to_state not in TRANSITIONS[current]):
+            raise InvalidTransition(f"{report_dir}: фото этапа {stage} в состоянии {current} не принимаются.")
+
+        if current == to_state:
+            first = len(report_meta.report_photos(report_dir, stage)) + 1
+        else:
+            report_meta.remove_photos(report_dir, stage)
+            first = 1
+        paths = []
+        for index, tmp_path in enumerate(staged, start=first):
+            path = os.path.join(report_dir, report_meta.photo_name(stage, index))
+            os.replace(tmp_path, path)
+            paths.append(path)
+
+        if current != to_state:
+            transition(report_dir, to_state, editor, defaults=defaults)
+        elif editor is not None:
+            meta = report_meta.update(report_dir, last_editor=editor)
+            task_index.set_status(report_dir, meta["status"], editor)
+    logger.info(f"Задача {report_dir}: сохранено фото этапа {stage}: {len(paths)} шт.")
+    return paths
@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import threading
+
+import storage
+import task_index
+import report_manifest
+
+# inotify есть только в Linux и требует пакета inotify_simple; без него работаем опросом
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+# Как часто опрашивать папку отчетов без inotify (секунды)
+POLL_INTERVAL = 30
+
+WATCH_MASK = 0
+if INotify is not None:
+    WATCH_MASK = (
+        flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO | flags.CLOSE_WRITE | flags.DELETE_SELF
+    )
+
+
+class ReportsWatcher:
+    """
+    Фоновая сверка индекса задач с папкой reports/, которую правят вручную.
+
+    Под Linux с inotify_simple изменения приходят событиями. Иначе раз в POLL_INTERVAL
+    делается дешевая сверка: каталог перечитывается, только если изменилось его mtime,
+    а report.txt открывается, только если изменилось mtime самого файла.
+    """
+
+    def __init__(self, reports_dir=task_index.REPORTS_DIR, interval=POLL_INTERVAL, use_inotify=True):
+        self.reports_dir = reports_dir
+        self.interval = interval
+        self.use_inotify = use_inotify and INotify is not None
+        # каталог -> (mtime_ns, подкаталоги, есть ли report.txt)
+        self._dirs = {}
+        # папка отчета -> mtime_ns ее report.txt
+        self._reports = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        # wd -> каталог и обратно: проверка "уже подписаны" не должна перебирать все подписки
+        self._watches = {}
+        self._watched = {}
+        # Каталоги, на которые подписаться не удалось (например, кончился max_user_watches):
+        # они сверяются опросом раз в interval
+        self._unwatched = set()
+        self._unwatched_polled_at = 0.0
+
+    def _scan_dir(self, directory, changed, visited, since_ns=None):
+        try:
+            stat = os.stat(directory)
+        except FileNotFoundError:
+            return
+        visited.add(directory)
+
+        cached = self._dirs.get(directory)
+        if cached and cached[0] == stat.st_mtime_ns:
+            subdirs, has_report = cached[1], cached[2]
+        else:
+            subdirs, has_report = [], False
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name == "report.txt":
+                        has_report = True
+            subdirs = tuple(subdirs)
+            self._dirs[directory] = (stat.st_mtime_ns, subdirs, has_report)
+
+        if has_report:
+            try:
+                mtime = os.stat(os.path.join(directory, "report.txt")).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime is not None and self._reports.get(directory) != mtime:
+                # При первом проходе берем только то, что менялось после прошлой сверки
+                if directory in self._reports or since_ns is None or mtime > since_ns:
+                    changed.add(directory)
+                self._reports[directory] = mtime
+        elif directory in self._reports:
+            del self._reports[directory]
+            changed.add(directory)
+
+        for subdir in subdirs:
+            self._scan_dir(subdir, changed, visited, since_ns)
+
+    def _apply(self, changed):
+        for report_dir in changed:
+            try:
+                task_index.sync_report_dir(report_dir)
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении индекса для {report_dir}: {e}")
+        if changed:
+            logger.info(f"Индекс задач обновлен по изменениям на диске: {len(changed)} отчетов.")
+
+    def _forget_under(self, directory):
+        prefix = os.path.join(directory, "")
+        for cache in (self._dirs, self._reports):
+            for path in [p for p in cache if p == directory or p.startswith(prefix)]:
+                del cache[path]
+        self._unwatched.difference_update(
+            [p for p in self._unwatched if p == directory or p.startswith(prefix)]
+        )
+
+    def poll(self, first=False):
+        """Один проход сверки. Возвращает число обновленных отчетов."""
+        started_ns = time.time_ns()
+        since_ns = None
+        if first:
+            mark = storage.get_meta("reports_reconciled_ns")
+            since_ns = int(mark) if mark else 0
+
+        changed, visited = set(), set()
+        self._scan_dir(self.reports_dir, changed, visited, since_ns)
+
+        # Каталоги, которые пропали с диска
+        for directory in [d for d in self._dirs if d not in visited]:
+            del self._dirs[directory]
+            if self._reports.pop(directory, None) is not None:
+                changed.add(directory)
+        if first:
+            # Отчеты, удаленные, пока бот не работал
+            changed.update(path for path in task_index.indexed_paths() if path not in self._reports)
+
+        self._apply(changed)
+        storage.set_meta("reports_reconciled_ns", str(started_ns))
+        return len(changed)
+
+    def _watch(self, directory):
+        try:
+            wd = self._inotify.add_watch(directory, WATCH_MASK)
+        except OSError:
+            return False
+        self._watches[wd] = directory
+        self._watched[directory] = wd
+        return True
+
+    def _add_watches(self):
+        failed = []
+        for directory in self._dirs:
+            if directory in self._watched or directory in self._unwatched:
+                continue
+            if not self._watch(directory):
+                failed.append(directory)
+        if failed:
+            if not self._unwatched:
+                logger.warning(
+                    f"Не удалось подписаться на изменения {len(failed)} каталогов (например, {failed[0]}), "
+                    f"возможно, мал fs.inotify.max_user_watches. Они будут сверяться опросом раз в {self.interval} с."
+                )
+            self._unwatched.update(failed)
+
+    def _poll_unwatched(self):
+        """Сверка каталогов без подписки; заодно пробуем подписаться на них снова, молча."""
+        now = time.monotonic()
+        if not self._unwatched or now - self._unwatched_polled_at < self.interval:
+            return
+        self._unwatched_polled_at = now
+        for directory in [d for d in self._unwatched if self._watch(d)]:
+            self._unwatched.discard(directory)
+        changed, visited = set(), set()
+        for directory in list(self._unwatched):
+            if not os.path.isdir(directory):
+                self._unwatched.discard(directory)
+                continue
+            self._scan_dir(directory, changed, visited)
+        self._apply(changed)
+        self._add_watches()
+
+    def _run_inotify(self):
+        self._inotify = INotify()
+        self._add_watches()
+        while not self._stop.is_set():
+            events = self._inotify.read(timeout=1000)
+            self._poll_unwatched()
+            if not events:
+                continue
+            changed, visited, touched = set(), set(), set()
+            for event in events:
+                if event.mask & flags.Q_OVERFLOW:
+                    # Очередь событий переполнилась — делаем обычную сверку
+                    self.poll()
+                    continue
+                directory = self._watches.get(event.wd)
+                if directory is None:
+                    continue
+                if event.mask & flags.IGNORED:
+                    del self._watches[event.wd]
+                    if self._watched.get(directory) == event.wd:
+                        del self._watched[directory]
+                    continue
+                if event.mask & flags.ISDIR and event.mask & (flags.DELETE | flags.MOVED_FROM):
+                    path = os.path.join(directory, event.name)
+                    self._forget_under(path)
+                    task_index.remove_tasks_under(path)
+                    report_manifest.remove(path)
+                touched.add(directory)
+            for directory in touched:
+                self._scan_dir(directory, changed, visited)
+            self._apply(changed)
+            self._add_watches()
+            storage.set_meta("reports_reconciled_ns", str(time.time_ns()))
+
+    def _run_polling(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Ошибка при сверке папки отчетов: {e}")
+
+    def _run(self):
+        try:
+            self.poll(first=True)
+        except Exception as e:
+            logger.error(f"Ошибка при начальной сверке папки отчетов: {e}")
+        if self.use_inotify:
+            logger.info(f"Слежение за {self.reports_dir} через inotify.")
+            try:
+                self._run_inotify()
+                return
+            except Exception as e:
+                logger.error(f"inotify недоступен ({e}), переходим на опрос.")
+        logger.info(f"Слежение за {self.reports_dir} опросом раз в {self.interval} с.")
+        self._run_polling()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="reports-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
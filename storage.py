@@ -0,0 +1,296 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Путь к базе данных по умолчанию
+DB_PATH = "bot.db"
+
+# Статус завершенной работы, все остальные статусы считаются незавершенными
+JOB_DONE = "Завершено"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    phone TEXT,
+    full_name TEXT,
+    registered_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    house_number TEXT NOT NULL,
+    full_name TEXT,
+    house_full_name TEXT,
+    work_type TEXT,
+    photo_before TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_user_status ON jobs (user_id, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_user_house ON jobs (user_id, house_number);
+CREATE INDEX IF NOT EXISTS idx_jobs_house ON jobs (house_number);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+"""
+
+_db_path = DB_PATH
+_local = threading.local()
+
+
+def get_connection():
+    """Возвращает соединение с базой для текущего потока."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != _db_path:
+        conn = sqlite3.connect(_db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL позволяет читать во время записи, busy_timeout — ждать блокировку, а не падать
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        _local.conn = conn
+        _local.path = _db_path
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Транзакция с немедленной блокировкой на запись (безопасна между процессами).
+    Вложенный вызов в том же потоке становится частью внешней транзакции.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def init(path=DB_PATH):
+    """Открывает базу по указанному пути и создает таблицы и индексы."""
+    global _db_path
+    _db_path = path
+    get_connection().executescript(SCHEMA)
+    logger.info(f"База данных открыта: {path}")
+
+
+def get_meta(key):
+    row = get_connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_meta(key, value):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+
+# Пользователи
+def _bump_users_version(conn):
+    """Увеличивает версию таблицы users; вызывается в той же транзакции, что и запись пользователей."""
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('users_version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+    return users_version(conn)
+
+
+def users_version(conn=None):
+    """Версия таблицы users: меняется при любой записи пользователей, в том числе другим процессом."""
+    row = (conn or get_connection()).execute("SELECT value FROM meta WHERE key = 'users_version'").fetchone()
+    return int(row["value"]) if row else 0
+
+
+def get_user(user_id):
+    row = get_connection().execute(
+        "SELECT phone, full_name FROM users WHERE user_id = ?", (str(user_id),)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def save_user(user_id, phone, full_name):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO users (user_id, phone, full_name, registered_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET phone = excluded.phone, full_name = excluded.full_name",
+            (str(user_id), phone, full_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        _bump_users_version(conn)
+
+
+def get_all_users():
+    rows = get_connection().execute("SELECT user_id, phone, full_name FROM users").fetchall()
+    return {row["user_id"]: {"phone": row["phone"], "full_name": row["full_name"]} for row in rows}
+
+
+def iter_users():
+    """Построчно отдает пользователей в порядке регистрации, не загружая всех в память."""
+    cursor = get_connection().execute(
+        "SELECT user_id, phone, full_name, registered_at FROM users ORDER BY registered_at, rowid"
+    )
+    for row in cursor:
+        yield dict(row)
+
+
+def save_users(users):
+    """
+    Сохраняет пачку пользователей {user_id: {"phone", "full_name"}} одной транзакцией.
+    Возвращает версию таблицы users после записи.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, phone, full_name, registered_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET phone = excluded.phone, full_name = excluded.full_name",
+            [(str(user_id), data["phone"], data["full_name"], now) for user_id, data in users.items()],
+        )
+        return _bump_users_version(conn)
+
+
+# Незавершенные работы
+def add_job(user_id, job):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO jobs (user_id, house_number, full_name, house_full_name, work_type, photo_before, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(user_id),
+                str(job["house_number"]),
+                job.get("full_name"),
+                job.get("house_full_name"),
+                job.get("work_type"),
+                job.get("photo_before"),
+                job.get("status", "Не завершено"),
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            ),
+        )
+
+
+def get_unfinished_jobs(user_id):
+    rows = get_connection().execute(
+        "SELECT house_number, full_name, house_full_name, work_type, photo_before, status FROM jobs "
+        "WHERE user_id = ? AND status != ? ORDER BY id",
+        (str(user_id), JOB_DONE),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def finish_jobs(user_id, house_number):
+    """Помечает незавершенные работы пользователя по дому как завершенные."""
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ? WHERE user_id = ? AND house_number = ? AND status != ?",
+            (JOB_DONE, str(user_id), str(house_number), JOB_DONE),
+        )
+
+
+# Перенос данных из JSON-файлов
+def _apply_job_record(jobs, record):
+    user_jobs = jobs.setdefault(record["user_id"], [])
+    if record["op"] == "add":
+        # Журнал мог остаться несжатым после падения между записью снимка и очисткой журнала:
+        # работа, уже попавшая в снимок, второй раз не добавляется
+        if record["job"] not in user_jobs:
+            user_jobs.append(record["job"])
+    elif record["op"] == "remove":
+        jobs[record["user_id"]] = [
+            job for job in user_jobs if job["house_number"] != record["house_number"]
+        ]
+
+
+def _load_legacy_jobs(snapshot_path):
+    """Работы из старого unfinished_jobs.json с проигранным поверх него журналом unfinished_jobs.json.journal."""
+    jobs = {}
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as file:
+            jobs = json.load(file)
+    journal_path = snapshot_path + ".journal"
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Последняя строка могла быть дописана не полностью при падении процесса
+                    logger.warning(f"Пропущена поврежденная запись журнала: {line!r}")
+                    continue
+                _apply_job_record(jobs, record)
+    return jobs
+
+
+def import_json_once(users_path, jobs_path):
+    """
+    Однократно переносит users_data.json и unfinished_jobs.json (вместе с журналом) в базу.
+    Повторный вызов ничего не делает.
+    """
+    if get_meta("json_imported"):
+        return
+
+    users = {}
+    if os.path.exists(users_path):
+        with open(users_path, "r", encoding="utf-8") as file:
+            users = json.load(file)
+    jobs = _load_legacy_jobs(jobs_path)
+
+    with transaction() as conn:
+        # Флаг проверяется еще раз под блокировкой: два процесса (tg.py и бот v10 делят bot.db)
+        # могли одновременно пройти первую проверку, а импортировать должен только один
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+        for user_id, data in users.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, phone, full_name) VALUES (?, ?, ?)",
+                (str(user_id), data.get("phone"), data.get("full_name")),
+            )
+        if users:
+            _bump_users_version(conn)
+        job_count = 0
+        for user_id, user_jobs in jobs.items():
+            for job in user_jobs:
+                conn.execute(
+                    "INSERT INTO jobs (user_id, house_number, full_name, house_full_name, work_type, photo_before, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        str(user_id),
+                        str(job["house_number"]),
+                        job.get("full_name"),
+                        job.get("house_full_name"),
+                        job.get("work_type"),
+                        job.get("photo_before"),
+                        job.get("status", "Не завершено"),
+                    ),
+                )
+                job_count += 1
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),),
+        )
+
+    logger.info(f"Импорт из JSON завершен: пользователей {len(users)}, работ {job_count}.")
+
+
+if __name__ == '__main__':
+    # Ручной запуск: python storage.py — перенос users_data.json и unfinished_jobs.json в bot.db
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    init(DB_PATH)
+    import_json_once("users_data.json", "unfinished_jobs.json")
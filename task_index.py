@@ -0,0 +1,278 @@
+import os
+import logging
+from datetime import datetime
+
+import storage
+import report_meta
+import report_manifest
+from report_meta import address_from_path
+
+logger = logging.getLogger(__name__)
+
+# Корневая папка отчетов: reports/<год>/<адрес>/<месяц>/report_N
+REPORTS_DIR = "reports"
+
+# Статусы задач, как они пишутся в report.txt
+STATUS_OPEN = report_meta.STATUS_OPEN
+STATUS_DONE = report_meta.STATUS_DONE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    house TEXT,
+    address TEXT,
+    work_type TEXT,
+    status TEXT NOT NULL,
+    owner INTEGER,
+    last_editor INTEGER,
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, id);
+"""
+
+# Индексы под фильтры find_tasks: поле фильтра, статус, порядок выдачи
+FILTER_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tasks_owner ON tasks (owner, status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_last_editor ON tasks (last_editor, status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_house ON tasks (house, status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_address ON tasks (address, status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_work_type ON tasks (work_type, status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (status, created_at);
+"""
+
+# Колонки, добавленные после первой версии таблицы
+ADDED_COLUMNS = {"owner": "INTEGER", "last_editor": "INTEGER"}
+
+TASK_COLUMNS = "id, house, address, work_type, path, owner, last_editor, created_at"
+
+# Префикс callback_data кнопки задачи: "task_<id>", где id — tasks.id
+CALLBACK_PREFIX = "task_"
+# callback_data кнопки завершенного отчета в /my_reports
+REPORT_CALLBACK_PREFIX = "report_"
+
+# Номер версии индекса в этом процессе: растет при любом изменении задач,
+# по нему сбрасываются закэшированные страницы списка задач
+_version = 0
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _changed():
+    global _version
+    _version += 1
+
+
+def version():
+    return _version
+
+
+def record_task(report_dir, house, work_type, status=STATUS_OPEN, owner=None, created_at=None, last_editor=None):
+    """Добавляет задачу в индекс или обновляет ее, если папка уже известна."""
+    now = _now()
+    with storage.transaction() as conn:
+        conn.execute(
+            "INSERT INTO tasks (path, house, address, work_type, status, owner, last_editor, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET house = excluded.house, address = excluded.address, "
+            "work_type = excluded.work_type, status = excluded.status, "
+            "owner = coalesce(excluded.owner, owner), last_editor = coalesce(excluded.last_editor, last_editor), "
+            "updated_at = excluded.updated_at",
+            (
+                report_dir, str(house), address_from_path(report_dir), work_type, status,
+                owner, last_editor, created_at or now, now,
+            ),
+        )
+    _changed()
+
+
+def set_status(report_dir, status, last_editor=None):
+    with storage.transaction() as conn:
+        conn.execute(
+            "UPDATE tasks SET status = ?, last_editor = coalesce(?, last_editor), updated_at = ? WHERE path = ?",
+            (status, last_editor, _now(), report_dir),
+        )
+    _changed()
+
+
+def remove_task(report_dir):
+    with storage.transaction() as conn:
+        conn.execute("DELETE FROM tasks WHERE path = ?", (report_dir,))
+    _changed()
+
+
+def remove_tasks_under(directory):
+    """Удаляет из индекса все отчеты внутри папки (папку удалили или перенесли)."""
+    prefix = os.path.join(directory, "")
+    with storage.transaction() as conn:
+        conn.execute(
+            "DELETE FROM tasks WHERE path = ? OR substr(path, 1, ?) = ?",
+            (directory, len(prefix), prefix),
+        )
+    _changed()
+
+
+def indexed_paths():
+    return {row["path"] for row in storage.get_connection().execute("SELECT path FROM tasks")}
+
+
+def sync_report_dir(report_dir):
+    """
+    Приводит запись индекса в соответствие с папкой отчета на диске.
+    Поля берутся из meta.json, а для еще не перенесенных отчетов — из report.txt.
+    Ручные правки report.txt, сделанные после meta.json, сначала переносятся в meta.json.
+    """
+    text_file_path = os.path.join(report_dir, report_meta.REPORT_FILE)
+    if not os.path.exists(text_file_path):
+        remove_task(report_dir)
+        if not os.path.exists(os.path.join(report_dir, report_meta.META_FILE)):
+            report_manifest.remove(report_dir)
+        return
+    # Под той же блокировкой, что и переходы report_state, чтобы не затереть одновременный переход
+    with storage.transaction():
+        report = report_meta.load_current(report_dir)
+        if report is None:
+            with open(text_file_path, "r", encoding="utf-8") as f:
+                report = report_meta.parse_report_txt(f.read())
+        if report:
+            record_task(
+                report_dir, report["house"], report["work_type"], report["status"],
+                report.get("owner"), report.get("created_at"), report.get("last_editor"),
+            )
+
+
+def get_task(task_id):
+    """Задача по id из индекса: {"id", "path", "house", "address", "work_type", "status", "owner"} или None."""
+    row = storage.get_connection().execute(
+        "SELECT id, path, house, address, work_type, status, owner FROM tasks WHERE id = ?", (task_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def task_callback_data(task_id, prefix=CALLBACK_PREFIX):
+    """callback_data кнопки задачи: короткий id вместо дома и типа работ, всегда меньше 64 байт."""
+    return f"{prefix}{task_id}"
+
+
+def parse_task_callback(data, prefix=CALLBACK_PREFIX):
+    """id задачи из callback_data кнопки или None, если это не кнопка задачи."""
+    if not data.startswith(prefix):
+        return None
+    try:
+        return int(data[len(prefix):])
+    except ValueError:
+        return None
+
+
+def get_unfinished_tasks():
+    """Незавершенные задачи в порядке создания: [{"id", "house", "work_type", "path"}]."""
+    rows = storage.get_connection().execute(
+        "SELECT id, house, work_type, path FROM tasks WHERE status = ? ORDER BY id", (STATUS_OPEN,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def find_tasks(status=STATUS_OPEN, house=None, address=None, work_type=None, owner=None,
+               created_from=None, created_to=None, limit=None, last_editor=None, newest_first=False):
+    """
+    Задачи индекса по фильтрам в порядке создания (newest_first — сначала новые). Каждый фильтр необязателен;
+    created_from/created_to — строки "YYYY-MM-DD[ HH:MM:SS]", created_to не включается.
+    Возвращает [{"id", "house", "address", "work_type", "path", "owner", "last_editor", "created_at"}].
+    """
+    conditions, params = [], []
+    for column, value in (
+        ("status", status), ("house", house), ("address", address),
+        ("work_type", work_type), ("owner", owner), ("last_editor", last_editor),
+    ):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(str(value) if column == "house" else value)
+    if created_from is not None:
+        conditions.append("created_at >= ?")
+        params.append(created_from)
+    if created_to is not None:
+        conditions.append("created_at < ?")
+        params.append(created_to)
+
+    query = f"SELECT {TASK_COLUMNS} FROM tasks"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id DESC" if newest_first else " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [dict(row) for row in storage.get_connection().execute(query, params)]
+
+
+def open_task_counts_by_owner():
+    """{owner: число незавершенных задач} — для напоминаний, по индексу idx_tasks_owner."""
+    rows = storage.get_connection().execute(
+        "SELECT owner, count(*) AS open_tasks FROM tasks WHERE owner IS NOT NULL AND status = ? GROUP BY owner",
+        (STATUS_OPEN,),
+    )
+    return {row["owner"]: row["open_tasks"] for row in rows}
+
+
+def get_unfinished_page(limit, after_id=None, before_id=None, owner=None, house=None):
+    """
+    Страница незавершенных задач по курсору id (без OFFSET, цена не зависит от номера страницы).
+    after_id — задачи после указанной, before_id — перед ней; owner и house сужают список (/my_tasks).
+    Возвращает (задачи [{"id", "house", "work_type", "path"}], есть ли задачи дальше в ту же сторону).
+    """
+    conditions, params = ["status = ?"], [STATUS_OPEN]
+    if owner is not None:
+        conditions.append("owner = ?")
+        params.append(owner)
+    if house is not None:
+        conditions.append("house = ?")
+        params.append(str(house))
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+        order = "DESC"
+    else:
+        conditions.append("id > ?")
+        params.append(after_id or 0)
+        order = "ASC"
+    rows = storage.get_connection().execute(
+        f"SELECT id, house, work_type, path FROM tasks WHERE {' AND '.join(conditions)} ORDER BY id {order} LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+    tasks = [dict(row) for row in rows[:limit]]
+    if before_id is not None:
+        tasks.reverse()
+    return tasks, len(rows) > limit
+
+
+def rebuild(reports_dir=REPORTS_DIR):
+    """Полностью пересобирает индекс обходом папки отчетов."""
+    found = 0
+    for root, _, files in os.walk(reports_dir):
+        if "report.txt" not in files:
+            continue
+        try:
+            sync_report_dir(root)
+            found += 1
+        except Exception as e:
+            logger.error(f"Ошибка при чтении файла {os.path.join(root, 'report.txt')}: {e}")
+
+    storage.set_meta("tasks_indexed", _now())
+    logger.info(f"Индекс задач пересобран: {found} отчетов в {reports_dir}.")
+
+
+def init(reports_dir=REPORTS_DIR):
+    """Создает таблицу индекса; при первом запуске один раз заполняет ее обходом reports/."""
+    conn = storage.get_connection()
+    conn.executescript(SCHEMA)
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+    added = [column for column in ADDED_COLUMNS if column not in columns]
+    for column in added:
+        conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {ADDED_COLUMNS[column]}")
+    conn.executescript(FILTER_INDEXES)
+    # Новые колонки заполняются из meta.json одной пересборкой
+    if added or not storage.get_meta("tasks_indexed"):
+        rebuild(reports_dir)
@@ -0,0 +1,199 @@
+import os
+import asyncio
+import glob
+import shutil
+import tempfile
+import unittest
+
+import httpx
+
+from downloads import DownloadManager, DownloadError, DownloadTooLarge
+
+URL = "https://files.example/file/bot123:secret/photos/file_1.jpg"
+
+
+def make_manager(handler, **kwargs):
+    """DownloadManager с локальным фейковым сервером вместо сети и без пауз между попытками."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    kwargs.setdefault("backoff_base", 0)
+    kwargs.setdefault("backoff_max", 0)
+    return DownloadManager(client=client, **kwargs)
+
+
+class DownloadManagerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.dir, "photo.jpg")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def part_files(self):
+        return glob.glob(os.path.join(self.dir, "*.part"))
+
+    async def test_retries_until_success(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(503)
+            return httpx.Response(200, content=b"x" * 1000)
+
+        manager = make_manager(handler)
+        self.assertEqual(await manager.download(URL, self.dest, expected_size=1000), self.dest)
+        await manager.close()
+
+        self.assertEqual(len(calls), 3)
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), b"x" * 1000)
+        self.assertEqual(manager.stats()["retries"], 2)
+        self.assertEqual(manager.stats()["completed"], 1)
+        self.assertEqual(self.part_files(), [])
+
+    async def test_gives_up_after_max_attempts(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(502)
+
+        manager = make_manager(handler, max_attempts=3)
+        with self.assertRaises(DownloadError) as cm:
+            await manager.download(URL, self.dest)
+        await manager.close()
+
+        self.assertEqual(len(calls), 3)
+        # Токен бота из URL в текст ошибки не попадает
+        self.assertNotIn("secret", str(cm.exception))
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(self.part_files(), [])
+        self.assertEqual(manager.stats()["failed"], 1)
+
+    async def test_no_retry_on_client_error(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(404)
+
+        manager = make_manager(handler)
+        with self.assertRaises(DownloadError):
+            await manager.download(URL, self.dest)
+        await manager.close()
+        self.assertEqual(len(calls), 1)
+
+    async def test_size_cap_by_content_length(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, content=b"x" * 2000)
+
+        manager = make_manager(handler, max_bytes=1000)
+        with self.assertRaises(DownloadTooLarge):
+            await manager.download(URL, self.dest)
+        await manager.close()
+
+        # Слишком большой файл не повторяется
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(self.part_files(), [])
+
+    async def test_size_cap_while_streaming(self):
+        async def chunks():
+            for _ in range(10):
+                yield b"x" * 500
+
+        manager = make_manager(lambda request: httpx.Response(200, content=chunks()), max_bytes=2000)
+        with self.assertRaises(DownloadTooLarge):
+            await manager.download(URL, self.dest)
+        await manager.close()
+
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(self.part_files(), [])
+
+    async def test_size_cap_by_expected_size(self):
+        manager = make_manager(lambda request: self.fail("запрос не должен уходить"), max_bytes=1000)
+        with self.assertRaises(DownloadTooLarge):
+            await manager.download(URL, self.dest, expected_size=5000)
+        await manager.close()
+
+    async def test_short_body_is_retried_and_cleaned_up(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, content=b"x" * 100)
+
+        manager = make_manager(handler, max_attempts=2)
+        with self.assertRaises(DownloadError):
+            await manager.download(URL, self.dest, expected_size=1000)
+        await manager.close()
+
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(self.part_files(), [])
+
+    async def test_transport_error_keeps_existing_file(self):
+        with open(self.dest, "wb") as f:
+            f.write(b"old")
+
+        def handler(request):
+            raise httpx.ConnectError("connection refused", request=request)
+
+        manager = make_manager(handler, max_attempts=2)
+        with self.assertRaises(DownloadError):
+            await manager.download(URL, self.dest)
+        await manager.close()
+
+        # Неудачное скачивание не портит уже лежащий файл
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(self.part_files(), [])
+
+
+    async def test_stalled_server_times_out_and_retries(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            # Сервер принял запрос и молчит дольше, чем длится попытка
+            await asyncio.sleep(1)
+            return httpx.Response(200, content=b"x")
+
+        manager = make_manager(handler, timeout=0.05, max_attempts=2)
+        with self.assertRaises(DownloadError):
+            await manager.download(URL, self.dest)
+        await manager.close()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(manager.stats()["retries"], 1)
+        self.assertEqual(manager.stats()["failed"], 1)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(self.part_files(), [])
+
+    async def test_body_stalled_mid_transfer_leaves_no_part_file(self):
+        calls = []
+
+        async def body():
+            yield b"x" * 100
+            await asyncio.sleep(1)
+            yield b"x" * 100
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, content=body())
+
+        manager = make_manager(handler, timeout=0.05, max_attempts=3)
+        with self.assertRaises(DownloadError):
+            await manager.download(URL, self.dest, expected_size=200)
+        await manager.close()
+
+        self.assertEqual(len(calls), 3)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(self.part_files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+import storage
+import task_index
+import report_meta
+import report_state
+import report_numbers
+import report_archive
+
+ADDRESS = "Уфа, Менделеева,д. 102"
+
+
+class MonthSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.reports_dir = os.path.join(self.dir, "reports")
+        self.archive_dir = os.path.join(self.dir, "archive")
+        storage.init(os.path.join(self.dir, "bot.db"))
+        task_index.init(self.reports_dir)
+        report_numbers.init()
+        report_archive.init()
+        self.month_dir = os.path.join(self.reports_dir, "2025", ADDRESS, "03")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def add_report(self, work_type, done=True):
+        report_dir = report_numbers.create_report_dir(self.reports_dir, "2025", ADDRESS, "03")
+        report_state.create(report_dir, "102", work_type, owner=7)
+        report_state.transition(report_dir, report_state.STATE_BEFORE_PHOTO, 7)
+        if done:
+            report_state.transition(report_dir, report_state.STATE_COMPLETED, 7)
+        return report_dir
+
+    def test_summary_lists_done_work(self):
+        self.add_report("Покраска")
+        self.add_report("Уборка", done=False)
+        self.add_report("Ремонт крыльца")
+
+        self.assertEqual(
+            report_meta.month_summary(self.month_dir),
+            "ук: Проведенные работы в МКД и на придомовой территории за 03.2025\n"
+            "Дом №102: Покраска\n"
+            "Дом №102: Ремонт крыльца\n",
+        )
+
+    def test_summary_survives_archiving(self):
+        self.add_report("Покраска")
+        expected = report_meta.month_summary(self.month_dir)
+
+        bundle = report_archive.archive_month(self.month_dir, self.archive_dir, self.reports_dir)
+
+        self.assertFalse(os.path.exists(self.month_dir))
+        with zipfile.ZipFile(bundle) as archive:
+            self.assertEqual(archive.read(report_archive.SUMMARY_FILE).decode("utf-8"), expected)
+        self.assertEqual(report_archive.month_summary(self.month_dir, self.archive_dir), expected)
+
+    def test_report_added_while_packing_keeps_month(self):
+        self.add_report("Покраска")
+        render = report_meta.render_month_summary
+
+        def render_and_add(*args):
+            # Новый отчет появляется, пока архив еще пишется
+            self.add_report("Уборка", done=False)
+            return render(*args)
+
+        with mock.patch.object(report_meta, "render_month_summary", side_effect=render_and_add):
+            with self.assertRaises(ValueError):
+                report_archive.archive_month(self.month_dir, self.archive_dir, self.reports_dir)
+
+        self.assertTrue({"report_1", "report_2"} <= set(os.listdir(self.month_dir)))
+        self.assertEqual(len(task_index.find_tasks(house="102")), 1)
+        bundle = report_archive.bundle_path(self.archive_dir, self.month_dir)
+        self.assertFalse(os.path.exists(bundle))
+        self.assertEqual(os.listdir(os.path.dirname(bundle)), [])
+
+    def test_no_summary_for_empty_month(self):
+        self.assertIsNone(report_archive.month_summary(self.month_dir, self.archive_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
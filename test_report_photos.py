@@ -0,0 +1,138 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+import storage
+import task_index
+import report_meta
+import report_state
+from photo_albums import AlbumCollector
+
+
+class StorePhotosTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        storage.init(os.path.join(self.dir, "bot.db"))
+        task_index.init(os.path.join(self.dir, "reports"))
+        self.report_dir = os.path.join(self.dir, "reports", "2026", "Уфа, Менделеева,д. 102", "10", "report_1")
+        os.makedirs(self.report_dir)
+        report_state.create(self.report_dir, "102", "Покраска", owner=7)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def stage(self, *contents):
+        paths = report_meta.staged_photo_paths(self.report_dir, len(contents))
+        for path, content in zip(paths, contents):
+            with open(path, "wb") as f:
+                f.write(content)
+        return paths
+
+    def read(self, paths):
+        result = []
+        for path in paths:
+            with open(path, "rb") as f:
+                result.append(f.read())
+        return result
+
+    def leftovers(self):
+        return [name for name in os.listdir(self.report_dir) if name.endswith(".part")]
+
+    def test_two_groups_of_one_stage_at_once(self):
+        # Альбом из 13 фото Telegram присылает двумя группами, и они сохраняются одновременно
+        groups = [self.stage(*(b"a%d" % i for i in range(10))), self.stage(*(b"b%d" % i for i in range(3)))]
+        barrier = threading.Barrier(len(groups))
+        errors = []
+
+        def store(staged):
+            barrier.wait()
+            try:
+                report_state.store_photos(
+                    self.report_dir, report_meta.PHOTO_BEFORE, staged, report_state.STATE_BEFORE_PHOTO, 7, owner=7
+                )
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=store, args=(staged,)) for staged in groups]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        photos = report_meta.report_photos(self.report_dir, report_meta.PHOTO_BEFORE)
+        self.assertEqual(
+            [os.path.basename(path) for path in photos],
+            [report_meta.photo_name(report_meta.PHOTO_BEFORE, i) for i in range(1, 14)],
+        )
+        # Ни одно фото не затерто другой группой
+        self.assertEqual(
+            sorted(self.read(photos)), sorted([b"a%d" % i for i in range(10)] + [b"b%d" % i for i in range(3)])
+        )
+        self.assertEqual(report_meta.load(self.report_dir)["state"], report_state.STATE_BEFORE_PHOTO)
+        self.assertEqual(self.leftovers(), [])
+
+    def test_later_photo_is_added_to_the_stage(self):
+        report_state.store_photos(
+            self.report_dir, report_meta.PHOTO_BEFORE, self.stage(b"1", b"2"), report_state.STATE_BEFORE_PHOTO, 7
+        )
+        paths = report_state.store_photos(
+            self.report_dir, report_meta.PHOTO_BEFORE, self.stage(b"3"), report_state.STATE_BEFORE_PHOTO, 7
+        )
+        self.assertEqual([os.path.basename(path) for path in paths], ["до_3.jpg"])
+        self.assertEqual(self.read(report_meta.report_photos(self.report_dir, report_meta.PHOTO_BEFORE)),
+                         [b"1", b"2", b"3"])
+
+    def test_rejected_stage_keeps_photos(self):
+        report_state.store_photos(
+            self.report_dir, report_meta.PHOTO_BEFORE, self.stage(b"old"), report_state.STATE_BEFORE_PHOTO, 7
+        )
+        report_state.store_photos(
+            self.report_dir, report_meta.PHOTO_AFTER, self.stage(b"after"), report_state.STATE_COMPLETED, 7
+        )
+        staged = self.stage(b"new")
+        with self.assertRaises(report_state.InvalidTransition):
+            report_state.store_photos(
+                self.report_dir, report_meta.PHOTO_BEFORE, staged, report_state.STATE_BEFORE_PHOTO, 7
+            )
+        self.assertEqual(self.read(report_meta.report_photos(self.report_dir, report_meta.PHOTO_BEFORE)), [b"old"])
+        report_meta.discard_staged(staged)
+        self.assertEqual(self.leftovers(), [])
+
+    def test_other_owner_is_rejected(self):
+        staged = self.stage(b"x")
+        with self.assertRaises(report_state.InvalidTransition):
+            report_state.store_photos(
+                self.report_dir, report_meta.PHOTO_BEFORE, staged, report_state.STATE_BEFORE_PHOTO, 8, owner=8
+            )
+        self.assertEqual(report_meta.report_photos(self.report_dir, report_meta.PHOTO_BEFORE), [])
+        self.assertEqual(report_meta.load(self.report_dir)["state"], report_state.STATE_CREATED)
+
+
+class AlbumCollectorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_groups_of_one_stage_are_one_batch(self):
+        albums = AlbumCollector(wait=0.05)
+        batches = []
+
+        async def on_complete(messages):
+            batches.append([message.message_id for message in messages])
+
+        key = (1, report_meta.PHOTO_BEFORE)
+        # Две группы альбома и одиночное фото, пришедшие подряд
+        for message_id, media_group_id in ((3, "g2"), (1, "g1"), (2, "g1"), (4, "g2")):
+            albums.add(SimpleNamespace(message_id=message_id, chat_id=1, media_group_id=media_group_id),
+                       on_complete, key=key)
+        self.assertTrue(albums.pending(key))
+        albums.add(SimpleNamespace(message_id=5, chat_id=1, media_group_id=None), on_complete, key=key)
+        await asyncio.sleep(0.2)
+
+        self.assertEqual(batches, [[1, 2, 3, 4, 5]])
+        self.assertFalse(albums.pending(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
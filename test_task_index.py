@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import storage
+import task_index
+
+
+class UnfinishedPageTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        storage.init(os.path.join(self.dir, "bot.db"))
+        task_index.init(os.path.join(self.dir, "reports"))
+        for i in range(1, 13):
+            task_index.record_task(
+                os.path.join(self.dir, "reports", "2026", "A", "10", f"report_{i}"),
+                "5" if i % 2 else "7", "Покраска", owner=1 if i % 3 else 2,
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def pages(self, limit, **filters):
+        pages, after_id = [], None
+        while True:
+            tasks, more = task_index.get_unfinished_page(limit, after_id=after_id, **filters)
+            pages.append([task["id"] for task in tasks])
+            if not more:
+                return pages
+            after_id = tasks[-1]["id"]
+
+    def test_pages_cover_every_filtered_task(self):
+        expected = [task["id"] for task in task_index.find_tasks(owner=1, house="5")]
+        pages = self.pages(2, owner=1, house="5")
+        self.assertTrue(all(len(page) <= 2 for page in pages))
+        self.assertEqual([task_id for page in pages for task_id in page], expected)
+
+    def test_previous_page(self):
+        first, _ = task_index.get_unfinished_page(3, owner=1)
+        second, _ = task_index.get_unfinished_page(3, after_id=first[-1]["id"], owner=1)
+        back, more = task_index.get_unfinished_page(3, before_id=second[0]["id"], owner=1)
+        self.assertEqual(back, first)
+        self.assertFalse(more)
+
+
+if __name__ == "__main__":
+    unittest.main()
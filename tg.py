@@ -1,6 +1,5 @@
 import os
 import logging
-import json
 from datetime import datetime
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
@@ -11,8 +10,15 @@ from telegram.ext import (
     ContextTypes,
     ConversationHandler,
 )
-from fpdf import FPDF
-import openpyxl
+
+import storage
+from user_cache import UserCache
+from users_export import UsersExporter
+import executors
+from catalogs import HouseIndex, WorkCatalog
+from executors import run_io
+import photo_store
+import file_ids
 
 # Настройка логирования
 logging.basicConfig(
@@ -34,6 +40,14 @@ WORKS_EXCEL_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/works.xls
 # Путь к файлам с данными пользователей и незавершенными работами
 USERS_DATA_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/users_data.json"
 UNFINISHED_JOBS_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/unfinished_jobs.json"
+# Путь к базе данных (пользователи и незавершенные работы)
+DB_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/bot.db"
+# Telegram ID администраторов: только им доступна выгрузка пользователей (/export_users)
+ADMIN_IDS = set()
+# Хранилище фото по содержимому
+BLOBS_DIR = "/Users/nikolajusakov/PycharmProjects/PythonProject/blobs"
+# Собранный снимок справочников (python catalog_snapshot.py)
+CATALOG_SNAPSHOT_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/catalog.snapshot.json"
 
 
 # Проверка наличия шрифта
@@ -44,59 +58,47 @@ if not os.path.exists(FONT_PATH):
 # Проверка и создание необходимых файлов
 def initialize_files():
     if not os.path.exists(USERS_EXCEL_PATH):
+        import openpyxl
+
         workbook = openpyxl.Workbook()
         sheet = workbook.active
         sheet.title = "Users"
         sheet.append(["Phone", "Full Name"])
         workbook.save(USERS_EXCEL_PATH)
 
-    if not os.path.exists(USERS_DATA_PATH):
-        with open(USERS_DATA_PATH, "w", encoding="utf-8") as file:
-            json.dump({}, file)
-
-    if not os.path.exists(UNFINISHED_JOBS_PATH):
-        with open(UNFINISHED_JOBS_PATH, "w", encoding="utf-8") as file:
-            json.dump({}, file)
+    # Пользователи и незавершенные работы хранятся в SQLite,
+    # старые JSON-файлы переносятся в базу один раз
+    storage.init(DB_PATH)
+    storage.import_json_once(USERS_DATA_PATH, UNFINISHED_JOBS_PATH)
+    photo_store.init(BLOBS_DIR)
+    file_ids.init()
 
 initialize_files()
 
-# Функции для работы с данными
-def save_user_to_excel(phone, full_name):
-    workbook = openpyxl.load_workbook(USERS_EXCEL_PATH)
-    sheet = workbook.active
-    sheet.append([phone, full_name])
-    workbook.save(USERS_EXCEL_PATH)
+# Пользователи читаются из базы один раз и дальше отдаются из памяти
+USERS = UserCache()
+# users.xlsx пересобирается в фоне из базы, регистрация файл не трогает
+USERS_EXPORTER = UsersExporter(USERS_EXCEL_PATH, before_export=USERS.flush)
+# Справочник домов строится один раз и пересобирается в фоне при изменении Houses.xlsx
+HOUSES = HouseIndex(HOUSES_EXCEL_PATH, snapshot_path=CATALOG_SNAPSHOT_PATH)
 
+# Функции для работы с данными
 def get_user_data(user_id):
     try:
-        with open(USERS_DATA_PATH, "r", encoding="utf-8") as file:
-            users_data = json.load(file)
-        return users_data.get(str(user_id))
+        return USERS.get(user_id)
     except Exception as e:
         logger.error(f"Ошибка при получении данных пользователя: {e}")
         return None
 
 def save_user_data(user_id, phone, full_name):
     try:
-        with open(USERS_DATA_PATH, "r", encoding="utf-8") as file:
-            users_data = json.load(file)
-
-        users_data[str(user_id)] = {"phone": phone, "full_name": full_name}
-
-        with open(USERS_DATA_PATH, "w", encoding="utf-8") as file:
-            json.dump(users_data, file, ensure_ascii=False, indent=4)
+        USERS.put(user_id, phone, full_name)
     except Exception as e:
         logger.error(f"Ошибка при сохранении данных пользователя: {e}")
 
 def add_unfinished_job(user_id, house_number, full_name, house_full_name, work_type, photo_before):
     try:
-        with open(UNFINISHED_JOBS_PATH, "r", encoding="utf-8") as file:
-            unfinished_jobs = json.load(file)
-
-        if str(user_id) not in unfinished_jobs:
-            unfinished_jobs[str(user_id)] = []
-
-        unfinished_jobs[str(user_id)].append({
+        storage.add_job(user_id, {
             "house_number": house_number,
             "full_name": full_name,
             "house_full_name": house_full_name,
@@ -104,32 +106,19 @@ def add_unfinished_job(user_id, house_number, full_name, house_full_name, work_t
             "photo_before": photo_before,
             "status": "Не завершено"
         })
-
-        with open(UNFINISHED_JOBS_PATH, "w", encoding="utf-8") as file:
-            json.dump(unfinished_jobs, file, ensure_ascii=False, indent=4)
     except Exception as e:
         logger.error(f"Ошибка при добавлении незавершенной работы: {e}")
 
 def get_unfinished_jobs(user_id):
     try:
-        with open(UNFINISHED_JOBS_PATH, "r", encoding="utf-8") as file:
-            unfinished_jobs = json.load(file)
-        return unfinished_jobs.get(str(user_id), [])
+        return storage.get_unfinished_jobs(user_id)
     except Exception as e:
         logger.error(f"Ошибка при получении списка незавершенных работ: {e}")
         return []
 
 def remove_unfinished_job(user_id, house_number):
     try:
-        with open(UNFINISHED_JOBS_PATH, "r", encoding="utf-8") as file:
-            unfinished_jobs = json.load(file)
-
-        if str(user_id) in unfinished_jobs:
-            unfinished_jobs[str(user_id)] = [job for job in unfinished_jobs[str(user_id)] if
-                                             job["house_number"] != house_number]
-
-        with open(UNFINISHED_JOBS_PATH, "w", encoding="utf-8") as file:
-            json.dump(unfinished_jobs, file, ensure_ascii=False, indent=4)
+        storage.finish_jobs(user_id, house_number)
     except Exception as e:
         logger.error(f"Ошибка при удалении незавершенной работы: {e}")
 
@@ -137,11 +126,11 @@ def remove_unfinished_job(user_id, house_number):
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Пользователь начал взаимодействие с ботом.")
     user_id = update.message.from_user.id
-    user_data = get_user_data(user_id)
+    user_data = await run_io(get_user_data, user_id)
 
     if user_data:
         # Пользователь уже авторизован
-        unfinished_jobs = get_unfinished_jobs(user_id)
+        unfinished_jobs = await run_io(get_unfinished_jobs, user_id)
 
         if unfinished_jobs:
             # Есть незавершенные работы
@@ -170,23 +159,14 @@ async def request_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def request_full_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     full_name = update.message.text
     context.user_data["full_name"] = full_name  # Сохраняем full_name в context.user_data
-    save_user_to_excel(context.user_data["phone"], full_name)
     save_user_data(update.message.from_user.id, context.user_data["phone"], full_name)
+    USERS_EXPORTER.mark_dirty()
     await update.message.reply_text("Авторизация завершена. Выберите номер дома:")
     return SELECTING_HOUSE
 
 # Обработчик полного имени дома
 def get_house_full_name(house_number):
-    try:
-        workbook = openpyxl.load_workbook(HOUSES_EXCEL_PATH)
-        sheet = workbook.active
-        for row in sheet.iter_rows(values_only=True):
-            if str(row[0]) == str(house_number):  # Сравниваем как строки
-                return row[1]  # Возвращаем полное название
-        return None  # Если дом не найден
-    except Exception as e:
-        logger.error(f"Ошибка при чтении файла домов: {e}")
-        return None
+    return HOUSES.get(house_number)  # None, если дом не найден
 # Обработчик выбора дома
 async def select_house(update: Update, context: ContextTypes.DEFAULT_TYPE):
     selected_house = update.message.text
@@ -197,18 +177,14 @@ async def select_house(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return SELECTING_HOUSE
 
     # Получаем список типов работ
-    work_types = get_work_types()
-    if not work_types:
+    if not WORKS.work_types:
         await update.message.reply_text("Ошибка: список типов работ пуст.")
         return ConversationHandler.END
 
-    # Создаем клавиатуру с кнопками для выбора типа работ
-    keyboard = [[KeyboardButton(work_type)] for work_type in work_types]
-    reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
-
+    # Клавиатура с типами работ собрана заранее
     await update.message.reply_text(
         f"Выбран дом: {house_full_name}. Выберите тип работы:",
-        reply_markup=reply_markup
+        reply_markup=WORKS.keyboard
     )
     return SELECTING_WORK_TYPE
 
@@ -234,48 +210,12 @@ async def select_house(update: Update, context: ContextTypes.DEFAULT_TYPE):
 WORKS_EXCEL_PATH = 'works.xlsx'
 
 
-# Функция для чтения данных из Excel и записи во второй колонке в текстовый файл
-def write_descriptions_to_text_file():
-    try:
-        # Загружаем рабочую книгу
-        workbook = openpyxl.load_workbook(WORKS_EXCEL_PATH)
-        sheet = workbook.active
-
-        # Открываем текстовый файл для записи
-        with open('descriptions.txt', 'w', encoding='utf-8') as text_file:
-            # Проходим по всем строкам, начиная со второй (пропуская заголовок)
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                # Записываем значение из второй колонки в текстовый файл
-                text_file.write(f"{row[1]}\n")  # Предполагаем, что описание во втором столбце
-
-    except Exception as e:
-        print(f"Ошибка при обработке файла: {e}")
-
+# Справочник типов работ: читается один раз, пересобирается в фоне при изменении works.xlsx
+WORKS = WorkCatalog(WORKS_EXCEL_PATH, descriptions_path='descriptions.txt', snapshot_path=CATALOG_SNAPSHOT_PATH)
 
-# Вызов функции
-write_descriptions_to_text_file()
 # обработчик типа работ в файле
 def get_work_types():
-    try:
-        workbook = openpyxl.load_workbook(WORKS_EXCEL_PATH)
-        sheet = workbook.active
-        work_types = []
-        descriptions = []
-
-        # Читаем данные из файла
-        for row in sheet.iter_rows(min_row=2, values_only=True):  # Пропускаем заголовок
-            work_types.append(row[0])  # Первый столбец — тип работы
-            descriptions.append(row[1])  # Второй столбец — описание
-
-        # Записываем второй столбец в текстовый файл
-        with open('descriptions.txt', 'w', encoding='utf-8') as file:
-            for description in descriptions:
-                file.write(f"{description}\n")
-
-        return work_types
-    except Exception as e:
-        logger.error(f"Ошибка при чтении файла работ: {e}")
-        return []
+    return WORKS.work_types
 # Обработчик выбора типа работ
 async def select_work_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     work_type = update.message.text
@@ -291,19 +231,19 @@ async def handle_photo_before(update: Update, context: ContextTypes.DEFAULT_TYPE
         return ConversationHandler.END
 
     # Остальная логика функции
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
-    photo_before = f"photo_before_{context.user_data['selected_house']}.jpg"
-    await file.download_to_drive(photo_before)
+    # Фото хранится по содержимому: повторно присланное не скачивается, разные работы по дому не затирают друг друга
+    photo_before = await photo_store.fetch(update.message.photo)
     context.user_data["photo_before"] = photo_before
     logger.info(f"Фото 'до начала работ' сохранено: {photo_before}.")
 
     # Добавляем незавершенную работу
-    add_unfinished_job(
+    house_full_name = get_house_full_name(context.user_data["selected_house"])
+    await run_io(
+        add_unfinished_job,
         update.message.from_user.id,
         context.user_data["selected_house"],
         context.user_data["full_name"],
-        get_house_full_name(context.user_data["selected_house"]),
+        house_full_name,
         context.user_data["work_type"],
         photo_before
     )
@@ -316,10 +256,7 @@ async def handle_photo_before(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 # Обработчик получения фото "после окончания работ"
 async def handle_photo_after(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
-    photo_after = f"photo_after_{context.user_data['selected_house']}.jpg"
-    await file.download_to_drive(photo_after)
+    photo_after = await photo_store.fetch(update.message.photo)
     context.user_data["photo_after"] = photo_after
     logger.info(f"Фото 'после окончания работ' сохранено: {photo_after}.")
 
@@ -331,6 +268,8 @@ async def handle_photo_after(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 logger.error("Недостаточно данных для создания PDF.")
                 return None
 
+            from fpdf import FPDF
+
             pdf = FPDF()
             pdf.add_page()
             pdf.add_font('DejaVu', '', FONT_PATH, uni=True)
@@ -357,7 +296,7 @@ async def handle_photo_after(update: Update, context: ContextTypes.DEFAULT_TYPE)
 # Обработчик выбора незавершенной работы
 async def select_unfinished_job(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    unfinished_jobs = get_unfinished_jobs(user_id)
+    unfinished_jobs = await run_io(get_unfinished_jobs, user_id)
 
     try:
         job_index = int(update.message.text) - 1
@@ -370,8 +309,8 @@ async def select_unfinished_job(update: Update, context: ContextTypes.DEFAULT_TY
             context.user_data["house_full_name"] = selected_job["house_full_name"]
             context.user_data["photo_before"] = selected_job["photo_before"]
 
-            # Отправляем первое фото
-            await update.message.reply_photo(selected_job["photo_before"], caption=f"Продолжаем работу: {context.user_data['work_type']} ({selected_job['house_full_name']})")
+            # Отправляем первое фото: если оно уже есть в Telegram, по file_id без загрузки
+            await file_ids.reply_photo(update.message, selected_job["photo_before"], caption=f"Продолжаем работу: {context.user_data['work_type']} ({selected_job['house_full_name']})")
             await update.message.reply_text("Пришлите фото после окончания работ.")
             return RECEIVING_PHOTO_BEFORE
         else:
@@ -384,6 +323,8 @@ async def select_unfinished_job(update: Update, context: ContextTypes.DEFAULT_TY
 # Функция для создания PDF
 def create_pdf(user_data):
     try:
+        from fpdf import FPDF
+
         pdf = FPDF()
         pdf.add_page()
         pdf.add_font('DejaVu', '', FONT_PATH, uni=True)
@@ -413,11 +354,21 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Действие отменено.")
     return ConversationHandler.END
 
+# Обработчик команды /export_users: пересобрать users.xlsx вне очереди
+async def export_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message.from_user.id not in ADMIN_IDS:
+        logger.warning(f"Пользователь {update.message.from_user.id} запросил выгрузку пользователей без прав.")
+        await update.message.reply_text("Эта команда доступна только администраторам.")
+        return
+    USERS_EXPORTER.request_export()
+    await update.message.reply_text("Выгрузка пользователей в users.xlsx запущена.")
+
 # Регистрация команд
 async def post_init(application: Application):
     await application.bot.set_my_commands([
         ("start", "Начать работу с ботом"),
         ("unfinished_jobs", "Показать незавершенные работы"),
+        ("export_users", "Выгрузить пользователей в users.xlsx"),
     ])
 # Обработчик подтверждения завершения работы
 async def confirm_completion(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -426,11 +377,12 @@ async def confirm_completion(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     if user_choice == "Завершить работу":
         # Удаляем незавершенную работу
-        remove_unfinished_job(user_id, context.user_data["selected_house"])
+        await run_io(remove_unfinished_job, user_id, context.user_data["selected_house"])
 
         # Обновляем статус в папке
         house_full_name = get_house_full_name(context.user_data["selected_house"])
-        save_files_to_folder(
+        await run_io(
+            save_files_to_folder,
             context.user_data["selected_house"],
             context.user_data["full_name"],
             house_full_name,
@@ -448,7 +400,7 @@ async def confirm_completion(update: Update, context: ContextTypes.DEFAULT_TYPE)
 # Обработчик продолжения работы
 async def continue_work(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    unfinished_jobs = get_unfinished_jobs(user_id)
+    unfinished_jobs = await run_io(get_unfinished_jobs, user_id)
 
     if update.message.text == "Новая работа":
         await update.message.reply_text("Выберите номер дома:")
@@ -488,7 +440,19 @@ def main():
     )
 
     application.add_handler(conv_handler)
-    application.run_polling()
+    application.add_handler(CommandHandler("export_users", export_users))
+
+    USERS_EXPORTER.start()
+    HOUSES.start_watching()
+    WORKS.start_watching()
+    executors.start_stats_logging()
+    try:
+        application.run_polling()
+    finally:
+        # Дописываем в базу пользователей, ожидающих отложенной записи, и выгружаем их в users.xlsx
+        USERS.flush()
+        USERS_EXPORTER.stop()
+        executors.shutdown()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
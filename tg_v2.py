@@ -1,5 +1,4 @@
 import os
-import json
 from datetime import datetime
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
@@ -12,6 +11,8 @@ from telegram.ext import (
 )
 import openpyxl
 
+import storage
+
 # Состояния для ConversationHandler
 REQUESTING_PHONE, REQUESTING_FULL_NAME, SELECTING_HOUSE, SELECTING_WORK_TYPE, RECEIVING_PHOTO_BEFORE, RECEIVING_PHOTO_AFTER, CONTINUING_WORK, SELECTING_UNFINISHED_JOB = range(8)
 
@@ -20,6 +21,8 @@ USERS_EXCEL_PATH = "users.xlsx"
 HOUSES_EXCEL_PATH = "Houses.xlsx"
 WORKS_EXCEL_PATH = "works.xlsx"
 UNFINISHED_JOBS_PATH = "unfinished_jobs.json"
+USERS_DATA_PATH = "users_data.json"
+DB_PATH = "bot.db"
 
 # Проверка и создание необходимых файлов
 def initialize_files():
@@ -30,22 +33,16 @@ def initialize_files():
         sheet.append(["Phone", "Full Name"])
         workbook.save(USERS_EXCEL_PATH)
 
-    if not os.path.exists(UNFINISHED_JOBS_PATH):
-        with open(UNFINISHED_JOBS_PATH, "w", encoding="utf-8") as file:
-            json.dump({}, file)
+    # Незавершенные работы хранятся в SQLite, старый JSON переносится в базу один раз
+    storage.init(DB_PATH)
+    storage.import_json_once(USERS_DATA_PATH, UNFINISHED_JOBS_PATH)
 
 initialize_files()
 
 # Функции для работы с данными
 def add_unfinished_job(user_id, house_number, full_name, house_full_name, work_type, photo_before):
     try:
-        with open(UNFINISHED_JOBS_PATH, "r", encoding="utf-8") as file:
-            unfinished_jobs = json.load(file)
-
-        if str(user_id) not in unfinished_jobs:
-            unfinished_jobs[str(user_id)] = []
-
-        unfinished_jobs[str(user_id)].append({
+        storage.add_job(user_id, {
             "house_number": house_number,
             "full_name": full_name,
             "house_full_name": house_full_name,
@@ -53,17 +50,12 @@ def add_unfinished_job(user_id, house_number, full_name, house_full_name, work_t
             "photo_before": photo_before,
             "status": "В работе"
         })
-
-        with open(UNFINISHED_JOBS_PATH, "w", encoding="utf-8") as file:
-            json.dump(unfinished_jobs, file, ensure_ascii=False, indent=4)
     except Exception as e:
         print(f"Ошибка при добавлении незавершенной работы: {e}")
 
 def get_unfinished_jobs(user_id):
     try:
-        with open(UNFINISHED_JOBS_PATH, "r", encoding="utf-8") as file:
-            unfinished_jobs = json.load(file)
-        return unfinished_jobs.get(str(user_id), [])
+        return storage.get_unfinished_jobs(user_id)
     except Exception as e:
         print(f"Ошибка при получении списка незавершенных работ: {e}")
         return []
@@ -14,7 +14,21 @@ from telegram.ext import (
     ContextTypes,
     ConversationHandler,
 )
-from fpdf import FPDF
+import executors
+from executors import run_io, run_cpu
+from catalog_snapshot import load_section
+import storage
+import task_index
+import report_numbers
+import report_meta
+import report_state
+from reports_watcher import ReportsWatcher
+from report_reaper import ReportReaper
+import photo_store
+import file_ids
+import report_pdf
+import report_archive
+from photo_albums import AlbumCollector
 
 # Состояния для ConversationHandler
 (
@@ -33,14 +47,22 @@ from fpdf import FPDF
 HOUSES_DICT_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/dic_houses.json"
 # Путь к файлу с списком работ
 WORKS_LIST_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/list_works.json"
+# Собранный снимок справочников (python catalog_snapshot.py)
+CATALOG_SNAPSHOT_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/catalog.snapshot.json"
+# База данных с индексом отчетов
+DB_PATH = "/Users/nikolajusakov/PycharmProjects/PythonProject/bot.db"
 
-# Загрузка словаря с домами
-with open(HOUSES_DICT_PATH, "r", encoding="utf-8") as f:
-    HOUSES_DICT = json.load(f)
+# Загрузка словаря с домами: из снимка, если он собран из текущего файла, иначе из самого файла
+HOUSES_DICT = load_section(CATALOG_SNAPSHOT_PATH, "houses_dict", HOUSES_DICT_PATH)
+if HOUSES_DICT is None:
+    with open(HOUSES_DICT_PATH, "r", encoding="utf-8") as f:
+        HOUSES_DICT = json.load(f)
 
 # Загрузка списка работ
-with open(WORKS_LIST_PATH, "r", encoding="utf-8") as f:
-    LIST_WORKS = json.load(f)
+LIST_WORKS = load_section(CATALOG_SNAPSHOT_PATH, "list_works", WORKS_LIST_PATH)
+if LIST_WORKS is None:
+    with open(WORKS_LIST_PATH, "r", encoding="utf-8") as f:
+        LIST_WORKS = json.load(f)
 
 # Кнопки
 ACTION_KEYBOARD = [["Добавить фото выполненной работы", "Добавить фото позже"]]
@@ -61,20 +83,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Больше символов Telegram в одно сообщение не пропускает
+MAX_MESSAGE_LENGTH = 4096
 # Константа для количества задач на странице
 ITEMS_PER_PAGE = 5
+# Как часто напоминать владельцам о незавершенных задачах (секунды)
+REMINDER_INTERVAL = 24 * 60 * 60
 
 
 
-def sanitize_callback_data(data):
-    """
-    Очищает callback_data: удаляет недопустимые символы и обрезает до 64 байт.
-    """
-    # Удаляем все символы, кроме букв, цифр, _ и -
-    data = re.sub(r"[^a-zA-Z0-9_-]", "_", data)
-    # Обрезаем до 64 байт
-    return data[:64]
-
 #функцию для обработки ввода текста и цифр, которая будет игнорировать знаки препинания и регистр:
 def normalize_input(text):
     """
@@ -88,8 +105,24 @@ def normalize_input(text):
     text = text.upper()
     return text
 
-def create_report_directory(house_number):
-    """Создает директорию для отчета на основе полного названия адреса."""
+# Поиск дома по вводу пользователя: "ул. Ленина 5", "д. 5" и "5" дают один и тот же номер дома
+def find_house_number(text):
+    """Возвращает номер дома из HOUSES_DICT для введенного текста, иначе нормализованный текст."""
+    house_number = normalize_input(text.strip())
+    # "д.102" после нормализации склеивается в "Д102"
+    words = [re.sub(r"^Д(?=\d)", "", word) for word in house_number.split()]
+    # Целиком, без пробелов ("19 Б"), и номер с литерой или просто номер в конце адреса
+    candidates = [house_number, "".join(words), "".join(words[-2:]), words[-1] if words else ""]
+    for candidate in candidates:
+        if candidate in HOUSES_DICT:
+            return candidate
+    return house_number
+
+def create_report_directory(house_number, user_data=None, owner=None):
+    """
+    Создает директорию для отчета на основе полного названия адреса.
+    Если передан user_data, в ней сразу заводится задача в состоянии created с полем "ук" за текущий месяц.
+    """
     # Получаем полное название адреса из словаря HOUSES_DICT
     if house_number not in HOUSES_DICT:
         raise ValueError(f"Дом с номером {house_number} не найден в словаре HOUSES_DICT.")
@@ -97,22 +130,60 @@ def create_report_directory(house_number):
     # Берем первый адрес из списка (или можно выбрать конкретный, если нужно)
     full_address = HOUSES_DICT[house_number][0]
 
-    # Создаем путь к директории
     now = datetime.now()
     year = now.strftime("%Y")
     month = now.strftime("%m")
-    base_dir = os.path.join("reports", year, full_address, month)
-
-    # Находим последний номер отчета
-    report_number = 1
-    while os.path.exists(os.path.join(base_dir, f"report_{report_number}")):
-        report_number += 1
-
-    report_dir = os.path.join(base_dir, f"report_{report_number}")
-    os.makedirs(report_dir, exist_ok=True)
+    # Номер отчета выдает счетчик в базе, без перебора существующих папок
+    report_dir = report_numbers.create_report_dir(task_index.REPORTS_DIR, year, full_address, month)
     logger.info(f"Директория создана: {report_dir}")
+    if user_data is not None:
+        report_state.create(
+            report_dir, house_number, user_data['work_type'], user_data.get('work_data'),
+            owner=owner, uk=report_meta.uk_line(),
+        )
     return report_dir
 
+def record_photo_before(report_dir, staged, editor=None):
+    """
+    Фото "до" скачаны под временными именами: они переносятся на места, задача переходит
+    в before_photo и появляется в списке задач. Возвращает пути фото.
+    """
+    return report_state.store_photos(
+        report_dir, report_meta.PHOTO_BEFORE, staged, report_state.STATE_BEFORE_PHOTO, editor, owner=editor
+    )
+
+def mark_report_pending(report_dir, editor=None):
+    """Фото "после" отложено: задача ждет его в состоянии awaiting_after."""
+    report_state.transition(report_dir, report_state.STATE_AWAITING_AFTER, editor)
+    return os.path.join(report_dir, report_meta.REPORT_FILE)
+
+def mark_report_done(report_dir, staged, editor=None):
+    """
+    Фото "после" скачаны под временными именами: они переносятся на места, задача завершена,
+    поле "ук" заполняется, если его нет. Возвращает пути фото.
+    """
+    return report_state.store_photos(
+        report_dir, report_meta.PHOTO_AFTER, staged, report_state.STATE_COMPLETED, editor,
+        defaults={"uk": report_meta.uk_line()},
+    )
+
+def render_report_pdf(report_dir, house_number, work_type):
+    """Собирает report.pdf со всеми фото до и после и возвращает путь к нему."""
+    return report_pdf.render_report_pdf(report_dir, house_number, work_type, FONT_PATH)
+
+async def download_report_photos(report_dir, photos):
+    """
+    Скачивает фото во временные файлы папки отчета. На места их переносит record_photo_before
+    или mark_report_done вместе с переходом, поэтому прежние фото не трогаются, пока переход не принят.
+    """
+    staged = await run_io(report_meta.staged_photo_paths, report_dir, len(photos))
+    try:
+        await photo_store.save_photos(photos, staged)
+    except BaseException:
+        await run_io(report_meta.discard_staged, staged)
+        raise
+    return staged
+
 # Функция для получения пагинированного списка задач
 def get_paginated_tasks(page: int = 0):
     """Возвращает список задач для указанной страницы."""
@@ -129,9 +200,8 @@ def create_task_keyboard():
 
     # Добавляем задачи
     for i, task in enumerate(tasks, start=1):
-        # Формируем callback_data
-        callback_data = f"task_{task['house']}_{task['work_type']}"
-        callback_data = sanitize_callback_data(callback_data)  # Очищаем данные
+        # Формируем callback_data: короткий id задачи из индекса
+        callback_data = task_index.task_callback_data(task['id'])
 
         keyboard.append([InlineKeyboardButton(
             f"{i}. Дом №{task['house']}, Тип работ: {task['work_type']}",
@@ -160,12 +230,17 @@ async def handle_inline_buttons(update: Update, context: ContextTypes.DEFAULT_TY
     data = query.data
     logger.info(f"Нажата кнопка: {data}")
 
-    if data.startswith("task_"):
-        # Обработка выбора задачи
-        _, house, work_type = data.split("_")
-        context.user_data["selected_house"] = house
-        context.user_data["work_type"] = work_type
-        await query.edit_message_text(f"Выбрана задача: Дом №{house}, Тип работ: {work_type}")
+    if data.startswith(task_index.CALLBACK_PREFIX):
+        # Обработка выбора задачи: папка отчета берется из индекса по id
+        task_id = task_index.parse_task_callback(data)
+        task = await run_io(task_index.get_task, task_id) if task_id is not None else None
+        if not task or task["status"] != task_index.STATUS_OPEN:
+            await query.edit_message_text("Задача не найдена или уже выполнена. Выберите другую.")
+            return CHOOSING_ACTION
+        context.user_data["selected_house"] = task["house"]
+        context.user_data["work_type"] = task["work_type"]
+        context.user_data["report_dir"] = task["path"]
+        await query.edit_message_text(f"Выбрана задача: Дом №{task['house']}, Тип работ: {task['work_type']}")
         return RECEIVING_PHOTO_AFTER
 # Обработчик команды /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -281,7 +356,9 @@ async def select_work_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Ошибка: полное название адреса не найдено. Пожалуйста, начните заново.")
             return ConversationHandler.END
 
-        context.user_data["report_dir"] = create_report_directory(full_address)
+        context.user_data["report_dir"] = await run_io(
+            create_report_directory, full_address, dict(context.user_data), update.effective_user.id
+        )
 
         # Создаем inline-кнопки для подтверждения
         keyboard = [
@@ -301,51 +378,82 @@ async def select_work_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Пожалуйста, введите число.")
         return SELECTING_WORK_TYPE
 
+# Фото, пришедшие альбомом, собираются и сохраняются одним пакетом
+ALBUMS = AlbumCollector()
+
+async def finish_album(messages, context, store_photos):
+    """Сохраняет альбом целиком; следующий текст пользователя обработает continue_after_album."""
+    message = messages[0]
+    photos = [m.photo for m in messages]
+    context.user_data["album_next_state"] = await store_photos(message, message.from_user.id, context, photos)
+
+async def end_after_album(update):
+    await update.message.reply_text("Не удалось сохранить отчет. Начните заново командой /start.")
+    return ConversationHandler.END
+
+async def continue_after_album(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Текст после альбома: если альбом сохранен, это выбор действия; если при сохранении
+    альбома разговор должен был завершиться, он завершается здесь.
+    """
+    next_state = context.user_data.pop("album_next_state", None)
+    if next_state == CHOOSING_ACTION:
+        return await choose_action(update, context)
+    if next_state == ConversationHandler.END:
+        return await end_after_album(update)
+    await update.message.reply_text("Пожалуйста, отправьте фото.")
+    return None
+
 async def handle_photo_before(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Проверяем, что папка для отчета создана
     if "report_dir" not in context.user_data:
         await update.message.reply_text("Ошибка: папка для отчета не создана. Пожалуйста, начните заново.")
         return ConversationHandler.END
 
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
+    if context.user_data.pop("album_next_state", None) == ConversationHandler.END:
+        return await end_after_album(update)
+    # Все фото этапа, пришедшие подряд (несколько групп альбома, альбом и одиночное фото), — один пакет
+    key = (update.message.chat_id, report_meta.PHOTO_BEFORE)
+    if update.message.media_group_id or ALBUMS.pending(key):
+        ALBUMS.add(update.message, lambda messages: finish_album(messages, context, store_photos_before), key=key)
+        return None
+    return await store_photos_before(update.message, update.effective_user.id, context, [update.message.photo])
 
+async def store_photos_before(message, editor, context, photos):
     report_dir = context.user_data["report_dir"]
-    photo_before_path = os.path.join(report_dir, "до.jpg")
+
+    # Проверка до скачивания: папку, простоявшую без фото дольше ReportReaper.max_age, могли удалить,
+    # а ее номер — выдать другому отчету. Окончательно состояние проверяется при переносе фото на места
+    if not await run_io(report_state.can_store_photos, report_dir, report_state.STATE_BEFORE_PHOTO, editor):
+        await message.reply_text("Фото для этой задачи уже приняты или задача удалена. Начните заново командой /start.")
+        return ConversationHandler.END
 
     try:
-        await file.download_to_drive(photo_before_path)
-        logger.info(f"Фото 'до начала работ' успешно сохранено: {photo_before_path}")
+        staged = await download_report_photos(report_dir, photos)
     except Exception as e:
         logger.error(f"Ошибка при сохранении фото 'до начала работ': {e}")
-        await update.message.reply_text("Ошибка при сохранении фото. Пожалуйста, попробуйте еще раз.")
+        await message.reply_text("Ошибка при сохранении фото. Пожалуйста, попробуйте еще раз.")
         return RECEIVING_PHOTO_BEFORE
 
-    context.user_data["photo_before"] = photo_before_path
-
-    # Создаем файл report.txt
-    text_file_path = os.path.join(report_dir, "report.txt")
+    # Фото переносятся на места и задача переходит в before_photo одной транзакцией
     try:
-        with open(text_file_path, "w", encoding="utf-8") as f:
-            f.write(f"Номер дома: {context.user_data['selected_house']}\n")
-            f.write(f"Тип работ: {context.user_data['work_type']}\n")
-            f.write(f"Данные: {context.user_data['work_data']}\n")
-            f.write("Статус: не выполнено\n")  # По умолчанию статус "не выполнено"
-
-            # Добавляем новое поле с текущим месяцем и годом
-            now = datetime.now()
-            month_year = now.strftime("%m.%Y")
-            f.write(f"ук: Проведенные работы в МКД и на придомовой территории за {month_year}\n")
-
-        logger.info(f"Файл report.txt создан: {text_file_path}")
+        paths = await run_io(record_photo_before, report_dir, staged, editor)
+        logger.info(f"Фото 'до начала работ' успешно сохранены: {len(paths)} шт. в {report_dir}")
+    except report_state.InvalidTransition:
+        await run_io(report_meta.discard_staged, staged)
+        await message.reply_text("Фото для этой задачи уже приняты или задача удалена. Начните заново командой /start.")
+        return ConversationHandler.END
     except Exception as e:
+        await run_io(report_meta.discard_staged, staged)
         logger.error(f"Ошибка при создании файла report.txt: {e}")
-        await update.message.reply_text("Ошибка при создании отчета. Пожалуйста, попробуйте еще раз.")
+        await message.reply_text("Ошибка при создании отчета. Пожалуйста, попробуйте еще раз.")
         return ConversationHandler.END
 
+    context.user_data["photo_before"] = os.path.join(report_dir, report_meta.photo_name(report_meta.PHOTO_BEFORE, 1))
+
     # Отправляем кнопки
     reply_markup = ReplyKeyboardMarkup(ACTION_KEYBOARD, one_time_keyboard=True)
-    await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
+    await message.reply_text("Выберите действие:", reply_markup=reply_markup)
     logger.info("Кнопки отправлены пользователю.")
 
     return CHOOSING_ACTION
@@ -364,18 +472,8 @@ async def choose_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Обновляем статус задачи в файле report.txt
         report_dir = context.user_data.get("report_dir")
         if report_dir:
-            text_file_path = os.path.join(report_dir, "report.txt")
             try:
-                with open(text_file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-
-                with open(text_file_path, "w", encoding="utf-8") as f:
-                    for line in lines:
-                        if "Статус:" in line:
-                            f.write("Статус: не выполнено\n")  # Обновляем статус
-                        else:
-                            f.write(line)
-
+                text_file_path = await run_io(mark_report_pending, report_dir, update.effective_user.id)
                 logger.info(f"Статус задачи обновлен в файле: {text_file_path}")
             except Exception as e:
                 logger.error(f"Ошибка при обновлении статуса задачи: {e}")
@@ -383,7 +481,7 @@ async def choose_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return CHOOSING_ACTION
 
         # Получаем список невыполненных задач
-        tasks = get_unfinished_tasks()
+        tasks = await run_io(get_unfinished_tasks)
         if not tasks:
             await update.message.reply_text("Нет невыполненных задач.")
             return CHOOSING_ACTION
@@ -404,7 +502,7 @@ async def choose_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info("Получение списка невыполненных задач.")
 
         # Получаем список невыполненных задач
-        tasks = get_unfinished_tasks()
+        tasks = await run_io(get_unfinished_tasks)
         if not tasks:
             await update.message.reply_text("Нет невыполненных задач.")
             return CHOOSING_ACTION
@@ -435,91 +533,71 @@ async def choose_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_photo_after(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Начало обработки фото 'после окончания работ'.")
 
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
+    if context.user_data.pop("album_next_state", None) == ConversationHandler.END:
+        return await end_after_album(update)
+    # Все фото этапа, пришедшие подряд (несколько групп альбома, альбом и одиночное фото), — один пакет
+    key = (update.message.chat_id, report_meta.PHOTO_AFTER)
+    if update.message.media_group_id or ALBUMS.pending(key):
+        ALBUMS.add(update.message, lambda messages: finish_album(messages, context, store_photos_after), key=key)
+        return None
+    return await store_photos_after(update.message, update.effective_user.id, context, [update.message.photo])
 
+async def store_photos_after(message, editor, context, photos):
     report_dir = context.user_data.get("report_dir")
     if not report_dir:
         logger.error("Ошибка: папка не найдена.")
-        await update.message.reply_text("Ошибка: папка не найдена.")
+        await message.reply_text("Ошибка: папка не найдена.")
         return ConversationHandler.END
 
-    photo_after_path = os.path.join(report_dir, "после.jpg")
-    logger.info(f"Путь для сохранения фото: {photo_after_path}")
+    if not await run_io(report_state.can_store_photos, report_dir, report_state.STATE_COMPLETED):
+        await message.reply_text("Эта задача уже завершена или удалена. Начните заново командой /start.")
+        return ConversationHandler.END
 
     try:
-        await file.download_to_drive(photo_after_path)
-        logger.info("Фото 'после окончания работ' успешно сохранено.")
+        staged = await download_report_photos(report_dir, photos)
     except Exception as e:
         logger.error(f"Ошибка при сохранении фото 'после окончания работ': {e}")
-        await update.message.reply_text("Ошибка при сохранении фото. Пожалуйста, попробуйте еще раз.")
+        await message.reply_text("Ошибка при сохранении фото. Пожалуйста, попробуйте еще раз.")
         return RECEIVING_PHOTO_AFTER
 
-    # Обновляем текстовый документ
-    text_file_path = os.path.join(report_dir, "report.txt")
+    # Фото переносятся на места и задача завершается одной транзакцией
     try:
-        with open(text_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        # Проверяем, есть ли уже поле "ук: Проведенные работы"
-        uk_field_exists = any("ук: Проведенные работы" in line for line in lines)
-
-        with open(text_file_path, "w", encoding="utf-8") as f:
-            for line in lines:
-                if "не выполнено" in line:
-                    f.write("Статус: выполнено\n")  # Обновляем статус
-                else:
-                    f.write(line)
-
-            # Добавляем новое поле, если его еще нет
-            if not uk_field_exists:
-                now = datetime.now()
-                month_year = now.strftime("%m.%Y")
-                f.write(f"ук: Проведенные работы в МКД и на придомовой территории за {month_year}\n")
-
-        logger.info(f"Текстовый файл обновлен: {text_file_path}")
+        paths = await run_io(mark_report_done, report_dir, staged, editor)
+        logger.info(f"Фото 'после окончания работ' успешно сохранены: {paths}")
+    except report_state.InvalidTransition:
+        await run_io(report_meta.discard_staged, staged)
+        await message.reply_text("Эта задача уже завершена или удалена. Начните заново командой /start.")
+        return ConversationHandler.END
     except Exception as e:
+        await run_io(report_meta.discard_staged, staged)
         logger.error(f"Ошибка при обновлении текстового файла: {e}")
-        await update.message.reply_text("Ошибка при обновлении текстового файла.")
+        await message.reply_text("Ошибка при обновлении текстового файла.")
         return ConversationHandler.END
 
     # Создаем PDF
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
-    pdf.set_font("DejaVu", size=12)
-
-    # Добавляем текст в PDF
-    pdf.cell(200, 10, txt=f"Номер дома: {context.user_data['selected_house']}", ln=True)
-    pdf.cell(200, 10, txt=f"Тип работ: {context.user_data['work_type']}", ln=True)
-    pdf.cell(200, 10, txt="Статус: выполнено", ln=True)
-
-    # Добавляем фото в PDF
-    pdf.image(os.path.join(report_dir, "до.jpg"), x=10, y=50, w=90)
-    pdf.image(photo_after_path, x=110, y=50, w=90)
-
-    pdf_output = os.path.join(report_dir, "report.pdf")
     try:
-        pdf.output(pdf_output)
+        pdf_output = await run_cpu(
+            render_report_pdf, report_dir, context.user_data['selected_house'], context.user_data['work_type']
+        )
         logger.info("PDF успешно создан.")
     except Exception as e:
         logger.error(f"Ошибка при создании PDF: {e}")
-        await update.message.reply_text("Ошибка при создании PDF. Пожалуйста, попробуйте еще раз.")
+        await message.reply_text("Ошибка при создании PDF. Пожалуйста, попробуйте еще раз.")
         return ConversationHandler.END
 
     # Отправляем PDF пользователю
     try:
-        with open(pdf_output, "rb") as file:
-            await update.message.reply_document(document=file,
-                                                caption=f"Отчет для дома №{context.user_data['selected_house']}")
+        # Уже отправлявшийся PDF уходит по file_id, без повторной загрузки
+        await file_ids.reply_document(message, pdf_output, filename="report.pdf",
+                                      caption=f"Отчет для дома №{context.user_data['selected_house']}")
         logger.info("PDF успешно отправлен.")
     except Exception as e:
         logger.error(f"Ошибка при отправке PDF: {e}")
-        await update.message.reply_text("Ошибка при отправке PDF.")
+        await message.reply_text("Ошибка при отправке PDF.")
         return ConversationHandler.END
 
     # Получаем список незавершенных задач
-    unfinished_tasks = get_unfinished_tasks()
+    unfinished_tasks = await run_io(get_unfinished_tasks)
     if unfinished_tasks:
         # Формируем список задач
         response = "Незавершенные задачи:\n"
@@ -527,13 +605,13 @@ async def handle_photo_after(update: Update, context: ContextTypes.DEFAULT_TYPE)
             response += f"{i}. Дом №{task['house']}, Тип работ: {task['work_type']}\n"
 
         # Отправляем список задач пользователю
-        await update.message.reply_text(response)
+        await message.reply_text(response)
     else:
-        await update.message.reply_text("Нет незавершенных задач.")
+        await message.reply_text("Нет незавершенных задач.")
 
     # Предлагаем выбрать действие
     reply_markup = ReplyKeyboardMarkup(CONTINUE_KEYBOARD, one_time_keyboard=True)
-    await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
+    await message.reply_text("Выберите действие:", reply_markup=reply_markup)
     logger.info("Кнопки для выбора действия отправлены пользователю.")
 
     return CHOOSING_ACTION
@@ -552,7 +630,9 @@ async def select_work_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["work_data"] = selected_work['Данные']
 
         # Создаем папку для отчета и сохраняем путь в context.user_data
-        context.user_data["report_dir"] = create_report_directory(context.user_data["selected_house"])
+        context.user_data["report_dir"] = await run_io(
+            create_report_directory, context.user_data["selected_house"], dict(context.user_data), update.effective_user.id
+        )
 
         # Создаем inline-кнопки для подтверждения
         keyboard = [
@@ -587,6 +667,158 @@ async def handle_work_confirmation(update: Update, context: ContextTypes.DEFAULT
         await query.edit_message_text("Выберите тип работ заново:")
         return SELECTING_WORK_TYPE
 
+# Напоминание владельцам о незавершенных задачах (по индексу, без обхода reports/)
+async def remind_open_tasks(context: ContextTypes.DEFAULT_TYPE):
+    counts = await run_io(task_index.open_task_counts_by_owner)
+    for owner, open_tasks in counts.items():
+        try:
+            await context.bot.send_message(
+                chat_id=owner,
+                text=f"У вас {open_tasks} невыполненных задач. Посмотреть их: /my_tasks",
+            )
+        except Exception as e:
+            logger.error(f"Не удалось отправить напоминание пользователю {owner}: {e}")
+    logger.info(f"Напоминания о задачах отправлены: {len(counts)} пользователям.")
+
+async def reply_long_text(message, text):
+    """Отправляет текст частями по строкам, каждая не длиннее MAX_MESSAGE_LENGTH."""
+    chunk = ""
+    for line in text.splitlines(keepends=True):
+        if chunk and len(chunk) + len(line) > MAX_MESSAGE_LENGTH:
+            await message.reply_text(chunk)
+            chunk = ""
+        chunk += line
+    if chunk:
+        await message.reply_text(chunk)
+
+# Обработчик команды /month_summary <номер дома> [ММ.ГГГГ] — сводка "ук" за месяц (по умолчанию текущий)
+async def month_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = list(context.args)
+    month = datetime.now()
+    if args and re.fullmatch(r"\d{2}\.\d{4}", args[-1]):
+        month = datetime.strptime(args.pop(), "%m.%Y")
+    if not args:
+        await update.message.reply_text("Укажите номер дома: /month_summary <номер дома> [ММ.ГГГГ]")
+        return
+    house = find_house_number(" ".join(args))
+    if house not in HOUSES_DICT:
+        await update.message.reply_text(f"Дом с номером {house} не найден.")
+        return
+
+    summaries = []
+    for address in HOUSES_DICT[house]:
+        month_dir = os.path.join(task_index.REPORTS_DIR, month.strftime("%Y"), address, month.strftime("%m"))
+        # Одна сводка месяца (manifest.json), а для перенесенного в архив месяца — summary.txt из архива
+        summary = await run_io(report_archive.month_summary, month_dir)
+        if summary is not None:
+            summaries.append(f"{address}\n{summary}")
+    if not summaries:
+        await update.message.reply_text(f"За {month.strftime('%m.%Y')} по дому №{house} отчетов нет.")
+        return
+    await reply_long_text(update.message, "\n".join(summaries))
+
+# Обработчик команды /my_reports [номер дома] — последние завершенные отчеты пользователя, PDF можно получить еще раз
+async def my_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    house = find_house_number(" ".join(context.args)) if context.args else None
+    reports = await run_io(
+        task_index.find_tasks, status=task_index.STATUS_DONE, house=house, owner=update.effective_user.id,
+        limit=ITEMS_PER_PAGE, newest_first=True,
+    )
+    if not reports:
+        suffix = f" по дому №{house}" if house else ""
+        await update.message.reply_text(f"У вас нет завершенных отчетов{suffix}.")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{i}. Дом №{report['house']}, Тип работ: {report['work_type']}",
+            callback_data=task_index.task_callback_data(report['id'], task_index.REPORT_CALLBACK_PREFIX),
+        )]
+        for i, report in enumerate(reports, start=1)
+    ]
+    await update.message.reply_text(
+        f"Ваши последние завершенные отчеты (до {ITEMS_PER_PAGE}). Выберите отчет, чтобы получить PDF:",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+    )
+
+# Повторная отправка PDF завершенного отчета из /my_reports
+async def resend_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    task_id = task_index.parse_task_callback(query.data, task_index.REPORT_CALLBACK_PREFIX)
+    task = await run_io(task_index.get_task, task_id) if task_id is not None else None
+    if not task or task["status"] != task_index.STATUS_DONE or task["owner"] != update.effective_user.id:
+        await query.message.reply_text("Отчет не найден.")
+        return
+
+    try:
+        # Отчет не менялся — берется прежний report.pdf и уходит по file_id, без повторной загрузки
+        pdf_output = await run_cpu(render_report_pdf, task["path"], task["house"], task["work_type"])
+        await file_ids.reply_document(query.message, pdf_output, filename="report.pdf",
+                                      caption=f"Отчет для дома №{task['house']}")
+        logger.info(f"PDF отчета {task['path']} отправлен повторно.")
+    except Exception as e:
+        logger.error(f"Ошибка при повторной отправке PDF: {e}")
+        await query.message.reply_text("Ошибка при отправке PDF.")
+
+# Префикс callback_data кнопок листания /my_tasks: "my_tasks_next_<id>" и "my_tasks_prev_<id>"
+MY_TASKS_PREFIX = "my_tasks_"
+
+async def my_tasks_page(context, after_id=None, before_id=None):
+    """
+    Страница своих незавершенных задач по курсору id (как у списка задач в tg_v10).
+    Возвращает текст страницы и кнопки листания; номера в тексте выбираются в receive_task_number.
+    """
+    task_filters = context.user_data.get("task_filters", {})
+    tasks, more = await run_io(task_index.get_unfinished_page, ITEMS_PER_PAGE, after_id, before_id, **task_filters)
+    context.user_data["unfinished_tasks"] = tasks
+    if not tasks:
+        return None, None
+
+    response = "Ваши невыполненные задачи:\n"
+    for i, task in enumerate(tasks, start=1):
+        response += f"{i}. Дом №{task['house']}, Тип работ: {task['work_type']}\n"
+    response += "Введите номер задачи для подтверждения:"
+
+    has_prev = more if before_id is not None else after_id is not None
+    has_next = more if before_id is None else True
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"{MY_TASKS_PREFIX}prev_{tasks[0]['id']}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"{MY_TASKS_PREFIX}next_{tasks[-1]['id']}"))
+    return response, InlineKeyboardMarkup([buttons]) if buttons else None
+
+# Обработчик команды /my_tasks [номер дома] — свои незавершенные задачи, при необходимости по одному дому
+async def my_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    house = find_house_number(" ".join(context.args)) if context.args else None
+    context.user_data["task_filters"] = {"owner": update.effective_user.id, "house": house}
+    response, reply_markup = await my_tasks_page(context)
+    if response is None:
+        suffix = f" по дому №{house}" if house else ""
+        await update.message.reply_text(f"У вас нет невыполненных задач{suffix}.")
+        return ConversationHandler.END
+
+    await update.message.reply_text(response, reply_markup=reply_markup)
+    return RECEIVING_TASK_NUMBER
+
+# Листание /my_tasks кнопками "Назад" и "Вперед"
+async def handle_my_tasks_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    direction, _, cursor = query.data[len(MY_TASKS_PREFIX):].partition("_")
+    if direction == "prev":
+        response, reply_markup = await my_tasks_page(context, before_id=int(cursor))
+    else:
+        response, reply_markup = await my_tasks_page(context, after_id=int(cursor))
+    if response is None:
+        await query.edit_message_text("Невыполненных задач больше нет. Посмотреть заново: /my_tasks")
+        return ConversationHandler.END
+    await query.edit_message_text(response, reply_markup=reply_markup)
+    return RECEIVING_TASK_NUMBER
+
 async def receive_task_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text.strip()
     logger.info(f"Пользователь ввел: {user_input}")
@@ -599,6 +831,7 @@ async def receive_task_number(update: Update, context: ContextTypes.DEFAULT_TYPE
             selected_task = tasks[choice - 1]
             context.user_data["selected_house"] = selected_task["house"]
             context.user_data["work_type"] = selected_task["work_type"]
+            context.user_data["report_dir"] = selected_task["path"]
 
             # Сообщаем пользователю о выборе задачи
             await update.message.reply_text(
@@ -617,38 +850,8 @@ async def receive_task_number(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 def get_unfinished_tasks():
-    base_dir = "reports"
-    unfinished_tasks = []
-
-    logger.info(f"Поиск невыполненных задач в директории: {base_dir}")
-
-    for root, _, files in os.walk(base_dir):
-        for file in files:
-            if file == "report.txt":
-                file_path = os.path.join(root, file)
-                logger.info(f"Найден файл отчета: {file_path}")
-
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        logger.info(f"Содержимое файла: {content}")
-
-                        if "не выполнено" in content:
-                            lines = content.split("\n")
-                            if len(lines) >= 2:
-                                house_number = lines[0].split(": ")[1].strip()
-                                work_type = lines[1].split(": ")[1].strip()
-                                unfinished_tasks.append({
-                                    "house": house_number,
-                                    "work_type": work_type,
-                                    "path": root
-                                })
-                                logger.info(f"Найдена невыполненная задача: Дом №{house_number}, Тип работ: {work_type}")
-                        else:
-                            logger.info(f"Задача в файле {file_path} выполнена.")
-                except Exception as e:
-                    logger.error(f"Ошибка при чтении файла {file_path}: {e}")
-
+    """Незавершенные задачи из индекса отчетов, без обхода папки reports."""
+    unfinished_tasks = task_index.get_unfinished_tasks()
     logger.info(f"Найдено невыполненных задач: {len(unfinished_tasks)}")
     return unfinished_tasks
 
@@ -657,25 +860,65 @@ def main():
     application = ApplicationBuilder().token('8127498518:AAFzskJYwY0-gkF2FdjJbtY1YcjZVd88wGs').build()
 
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[CommandHandler("start", start), CommandHandler("my_tasks", my_tasks)],
         states={
             SELECTING_HOUSE: [MessageHandler(filters.TEXT & ~filters.COMMAND, select_house)],
             SELECTING_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, select_address)],
             CONFIRMING_ADDRESS: [CallbackQueryHandler(handle_address_confirmation)],
             SELECTING_WORK_TYPE: [MessageHandler(filters.TEXT & ~filters.COMMAND, select_work_type)],
             CONFIRMING_WORK_TYPE: [CallbackQueryHandler(handle_work_confirmation)],
-            RECEIVING_PHOTO_BEFORE: [MessageHandler(filters.PHOTO, handle_photo_before)],
+            RECEIVING_PHOTO_BEFORE: [
+                MessageHandler(filters.PHOTO, handle_photo_before),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, continue_after_album),
+            ],
             CHOOSING_ACTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_action)],
-            RECEIVING_TASK_NUMBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_task_number)],
+            RECEIVING_TASK_NUMBER: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_task_number),
+                CallbackQueryHandler(handle_my_tasks_page, pattern=f"^{MY_TASKS_PREFIX}"),
+            ],
             # Новый обработчик
-            RECEIVING_PHOTO_AFTER: [MessageHandler(filters.PHOTO, handle_photo_after)],
+            RECEIVING_PHOTO_AFTER: [
+                MessageHandler(filters.PHOTO, handle_photo_after),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, continue_after_album),
+            ],
         },
-        fallbacks=[CommandHandler("start", start)],
+        fallbacks=[CommandHandler("start", start), CommandHandler("my_tasks", my_tasks)],
     )
 
 
+    # Раньше разговора: кнопки отчетов не должны попадать в обработчик выбора задачи
+    application.add_handler(CommandHandler("my_reports", my_reports))
+    application.add_handler(CommandHandler("month_summary", month_summary))
+    application.add_handler(CallbackQueryHandler(resend_report, pattern=f"^{task_index.REPORT_CALLBACK_PREFIX}"))
     application.add_handler(conv_handler)
-    application.run_polling()
+
+    # JobQueue есть, только если установлен python-telegram-bot[job-queue]
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(remind_open_tasks, interval=REMINDER_INTERVAL, first=REMINDER_INTERVAL)
+    else:
+        logger.warning("JobQueue недоступен, напоминания о задачах отключены.")
+
+    # Индекс отчетов: при первом запуске заполняется одним обходом reports/, дальше его ведут обработчики
+    storage.init(DB_PATH)
+    task_index.init(task_index.REPORTS_DIR)
+    report_numbers.init()
+    # Фото хранятся один раз по содержимому, в папках отчетов — жесткие ссылки
+    photo_store.init(photo_store.BLOBS_DIR)
+    file_ids.init()
+    # Ручные правки папки reports/ подхватываются в фоне
+    reports_watcher = ReportsWatcher(task_index.REPORTS_DIR)
+    reports_watcher.start()
+    # Папки, брошенные до первого фото, удаляются в фоне, их номера выдаются заново
+    report_reaper = ReportReaper(task_index.REPORTS_DIR)
+    report_reaper.start()
+
+    executors.start_stats_logging()
+    try:
+        application.run_polling()
+    finally:
+        reports_watcher.stop()
+        report_reaper.stop()
+        executors.shutdown()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
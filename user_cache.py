@@ -0,0 +1,121 @@
+import time
+import logging
+import threading
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед записью накопленных изменений в базу (секунды)
+FLUSH_DELAY = 2.0
+# Как часто проверять, не изменились ли пользователи в базе другим процессом (секунды)
+CHECK_INTERVAL = 1.0
+
+
+class UserCache:
+    """
+    Кэш пользователей в памяти процесса.
+
+    Все пользователи читаются из базы один раз, get() отвечает из словаря.
+    put() сразу обновляет словарь, а в базу изменения пишутся пачкой после паузы FLUSH_DELAY.
+    Если версия пользователей в базе (storage.users_version) изменилась не нами
+    (другой процесс), кэш перечитывается. Записи в другие таблицы на кэш не влияют.
+    """
+
+    def __init__(self, flush_delay=FLUSH_DELAY, check_interval=CHECK_INTERVAL):
+        self.flush_delay = flush_delay
+        self.check_interval = check_interval
+        self._users = {}
+        self._pending = {}
+        # Изменения, которые сейчас пишутся в базу: put() их уже не держит, а в базе их еще нет
+        self._flushing = {}
+        self._lock = threading.Lock()
+        # Записи в базу идут по очереди, чтобы более старая пачка не перезаписала более новую
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._version = None
+        self._checked_at = 0.0
+        self._reload()
+
+    def _reload(self):
+        # Версия читается до пользователей: запись между чтениями вызовет еще одно перечитывание, а не потерю
+        version = storage.users_version()
+        users = storage.get_all_users()
+        with self._lock:
+            # Еще не записанные изменения важнее прочитанного из базы
+            users.update(self._flushing)
+            users.update(self._pending)
+            self._users = users
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info(f"Кэш пользователей загружен: {len(users)} записей.")
+
+    def _check_for_changes(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if storage.users_version() != self._version:
+            logger.info("База пользователей изменена извне, перечитываем кэш.")
+            self._reload()
+
+    def get(self, user_id):
+        """Возвращает данные пользователя или None."""
+        self._check_for_changes()
+        return self._users.get(str(user_id))
+
+    def put(self, user_id, phone, full_name):
+        """Сохраняет пользователя в кэш и откладывает запись в базу."""
+        with self._lock:
+            data = {"phone": phone, "full_name": full_name}
+            self._users[str(user_id)] = data
+            self._pending[str(user_id)] = data
+            self._schedule()
+
+    def _schedule(self):
+        # Вызывается под self._lock
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.flush_delay, self._flush_by_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_by_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            # Ошибка уже в логе, повтор запланирован в flush()
+            pass
+
+    def flush(self):
+        """
+        Записывает накопленные изменения в базу. Сама запись идет без self._lock,
+        поэтому put() из обработчиков не ждет базу (BEGIN IMMEDIATE может ждать до busy_timeout).
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, {}
+                self._flushing = pending
+            if not pending:
+                return
+            try:
+                version = storage.save_users(pending)
+            except Exception as e:
+                # Вернем изменения в очередь (более новые put() важнее) и попробуем еще раз через FLUSH_DELAY
+                with self._lock:
+                    pending.update(self._pending)
+                    self._pending = pending
+                    self._flushing = {}
+                    self._schedule()
+                logger.error(f"Не удалось записать пользователей в базу, повтор через {self.flush_delay} с: {e}")
+                raise
+            with self._lock:
+                self._flushing = {}
+                # Наша собственная запись не должна вызывать перечитывание кэша,
+                # но если до нее версию уже сменил другой процесс, перечитаем при следующей проверке
+                if self._version == version - 1:
+                    self._version = version
+        logger.info(f"В базу записано пользователей: {len(pending)}.")
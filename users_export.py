@@ -0,0 +1,98 @@
+import os
+import logging
+import threading
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Как часто фоновый поток пересобирает users.xlsx, если были новые регистрации (секунды)
+EXPORT_INTERVAL = 300
+
+
+def export_users_to_excel(path):
+    """Пересобирает users.xlsx из базы, записывая строки потоком (write-only режим openpyxl)."""
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Users")
+    sheet.append(["Phone", "Full Name"])
+
+    count = 0
+    for user in storage.iter_users():
+        sheet.append([user["phone"], user["full_name"]])
+        count += 1
+
+    # Пишем во временный файл и подменяем, чтобы users.xlsx никогда не был недописанным
+    tmp_path = path + ".tmp.xlsx"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Файл {path} пересобран: {count} пользователей.")
+    return count
+
+
+class UsersExporter:
+    """
+    Фоновая выгрузка пользователей в users.xlsx.
+
+    Регистрация только отмечает, что выгрузка устарела (mark_dirty),
+    файл пересобирается в отдельном потоке раз в interval секунд или сразу по request_export().
+    """
+
+    def __init__(self, path, interval=EXPORT_INTERVAL, before_export=None):
+        self.path = path
+        self.interval = interval
+        # Вызывается перед выгрузкой, например чтобы дописать в базу отложенные изменения
+        self.before_export = before_export
+        self._dirty = False
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def request_export(self):
+        """Просит пересобрать файл немедленно."""
+        self._dirty = True
+        self._wakeup.set()
+
+    def export(self):
+        self._dirty = False
+        try:
+            if self.before_export is not None:
+                self.before_export()
+            export_users_to_excel(self.path)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Ошибка при выгрузке пользователей в {self.path}: {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._dirty:
+                self.export()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="users-export", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток и выгружает последние изменения."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._dirty:
+            self.export()
+
+
+if __name__ == '__main__':
+    # Ручной запуск: python users_export.py — пересобрать users.xlsx из bot.db
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    storage.init(storage.DB_PATH)
+    export_users_to_excel("users.xlsx")